@@ -6,6 +6,7 @@ import subprocess
 import json
 import tempfile
 import os
+from database import ROW_ID_COLUMN
 from .config import Config
 
 class DatabaseManager:
@@ -50,6 +51,7 @@ class DatabaseManager:
                     for row in results:
                         col_name = row['column_name']
                         if (isinstance(col_name, str) and 
+                            col_name != ROW_ID_COLUMN and
                             col_name.replace('_', '').replace('-', '').isalnum() and 
                             len(col_name) <= 50):
                             safe_columns.append(col_name)
@@ -104,7 +106,8 @@ class DatabaseManager:
                     cur.execute("SET statement_timeout = '30s'")
                     cur.execute(sql_query)
                     results = cur.fetchmany(1000)  # Limit results
-                    return [dict(row) for row in results]
+                    # The row id the table pages are keyed by is not part of the data
+                    return [{k: v for k, v in row.items() if k != ROW_ID_COLUMN} for row in results]
         except psycopg2.Error as e:
             raise ValueError(f"Query execution failed: {str(e)}")
     
@@ -155,6 +158,6 @@ class DatabaseManager:
                     cur.execute("SET statement_timeout = '30s'")
                     cur.execute(query)
                     results = cur.fetchall()
-                    return [dict(row) for row in results]
+                    return [{k: v for k, v in row.items() if k != ROW_ID_COLUMN} for row in results]
         except psycopg2.Error as e:
             raise ValueError(f"Query execution failed: {str(e)}")
\ No newline at end of file
@@ -5,6 +5,7 @@ import tempfile
 import os
 from typing import Dict, Any
 import plotly.io as pio
+from database import ROW_ID_COLUMN
 import cloudinary
 import cloudinary.uploader
 
@@ -182,7 +183,7 @@ def execute_query_dataframe(db, sql_query: str) -> pd.DataFrame:
     
     try:
         with db.get_connection() as conn:
-            return pd.read_sql_query(sql_query, conn)
+            return pd.read_sql_query(sql_query, conn).drop(columns=ROW_ID_COLUMN, errors='ignore')
     except Exception as e:
         raise ValueError(f"Query execution failed: {str(e)}")
 
@@ -2,21 +2,37 @@ from flask import Flask
 from flask_cors import CORS
 import os
 from routes import register_routes
+from inference.uploads import UploadRequest
+from inference.result_store import result_store
+from inference import model_registry
 
 app = Flask(__name__)
+# Uploads are hashed and kept in memory while parsed, see inference/uploads.py
+app.request_class = UploadRequest
 CORS(app)
 
 # Configure upload settings
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# CSV uploads above the streaming threshold are predicted chunk by chunk, so the
+# request limit can be far above what fits in memory (Excel is still capped)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', 4096)) * 1024 * 1024
+app.config['STREAM_THRESHOLD_BYTES'] = int(os.getenv('PREDICT_STREAM_THRESHOLD_MB', 16)) * 1024 * 1024
+app.config['MAX_IN_MEMORY_UPLOAD_BYTES'] = int(os.getenv('MAX_IN_MEMORY_UPLOAD_MB', 16)) * 1024 * 1024
 
-# Create upload directory if it doesn't exist
+# Create upload and result directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(result_store.folder, exist_ok=True)
 
 # Register all routes
 register_routes(app)
 
+# Expire and evict stored prediction results, including ones left from before a restart
+result_store.start_janitor()
+
+# Follow model releases and replaced files of the loaded models (MODEL_PRELOAD=true loads them all at startup)
+model_registry.start_watcher()
+
 if __name__ == '__main__':
     import os
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
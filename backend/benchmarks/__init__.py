@@ -0,0 +1,6 @@
+"""Inference benchmarks for the model wrappers.
+
+    python -m benchmarks.run --models k2 kepler --rows 1 1000 1000000 --output bench.jsonl
+    python -m benchmarks.compare before.jsonl after.jsonl
+    python -m benchmarks.cascade --models k2 --csv holdout.csv --label-column disposition
+"""
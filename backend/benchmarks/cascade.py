@@ -0,0 +1,129 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from inference import model_registry
+from inference.cascade import DECIDED_BY_FULL, Cascade
+from inference.profiling import record_stages
+from inference.synthetic import synthetic_frame
+
+from .run import run_info
+
+DEFAULT_ROUNDS = [10, 25, 50, 100]
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def model_booster(loaded) -> xgb.Booster:
+    if 'booster' in loaded.artifacts:
+        return loaded.artifacts['booster']
+    return loaded.artifacts['model'].get_booster()
+
+
+def timed_predict(loaded, df: pd.DataFrame, repeat: int):
+    """Last output, and median seconds of the predict stage and of the whole call"""
+    predict_seconds, total_seconds = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with record_stages() as timings:
+            result = loaded.predict(df)
+        total_seconds.append(time.perf_counter() - start)
+        if isinstance(result, str):  # Error message
+            raise RuntimeError(result)
+        predict_seconds.append(timings.get('predict', 0.0))
+    return result, statistics.median(predict_seconds), statistics.median(total_seconds)
+
+
+def point(loaded, df: pd.DataFrame, reference: np.ndarray, labels: Optional[np.ndarray],
+          cascade: Optional[Cascade], repeat: int) -> Dict[str, Any]:
+    """Throughput and accuracy of one cascade setting (None: the whole ensemble for every row)"""
+    loaded.artifacts['cascade'] = cascade
+    result, predict_seconds, total_seconds = timed_predict(loaded, df, repeat)
+    predicted = result['predicted_class'].astype(str).to_numpy()
+    return {
+        'model_type': loaded.model_type,
+        'model_version': loaded.version,
+        'rows': len(df),
+        'rounds': cascade.rounds if cascade else None,
+        'threshold': cascade.threshold if cascade else None,
+        'escalated': float((result['decided_by'] == DECIDED_BY_FULL).mean()) if cascade else 1.0,
+        # Share of rows classified as the whole ensemble classifies them
+        'agreement': float((predicted == reference).mean()),
+        'accuracy': float((predicted == labels).mean()) if labels is not None else None,
+        'predict_seconds': round(predict_seconds, 6),
+        'total_seconds': round(total_seconds, 6),
+        'predict_rows_per_second': round(len(df) / predict_seconds, 1) if predict_seconds else None,
+        'rows_per_second': round(len(df) / total_seconds, 1) if total_seconds else None,
+    }
+
+
+def curve(loaded, df: pd.DataFrame, labels: Optional[np.ndarray], rounds_list, thresholds, repeat: int):
+    """Records for the whole ensemble, then for every rounds x threshold cascade"""
+    booster = model_booster(loaded)
+    original = loaded.artifacts.get('cascade')
+    try:
+        loaded.artifacts['cascade'] = None
+        reference = loaded.predict(df)
+        if isinstance(reference, str):  # Error message
+            raise RuntimeError(reference)
+        reference = reference['predicted_class'].astype(str).to_numpy()
+
+        yield point(loaded, df, reference, labels, None, repeat)
+        total = booster.num_boosted_rounds()
+        for rounds in rounds_list:
+            if rounds >= total:
+                continue
+            for threshold in thresholds:
+                yield point(loaded, df, reference, labels, Cascade(booster, rounds, threshold, min_rows=0), repeat)
+    finally:
+        loaded.artifacts['cascade'] = original
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Accuracy versus throughput of cascade settings per model.')
+    parser.add_argument('--models', nargs='+', default=model_registry.model_types)
+    parser.add_argument('--rows', type=int, default=100_000, help='synthetic rows, when no --csv is given')
+    parser.add_argument('--csv', help='scored instead of synthetic rows, e.g. a labelled hold-out set')
+    parser.add_argument('--label-column', help='true class column of --csv, to report accuracy')
+    parser.add_argument('--rounds', nargs='+', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--thresholds', nargs='+', type=float, default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='append JSON lines here instead of printing them')
+    args = parser.parse_args(argv)
+
+    info = run_info()
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for model_type in args.models:
+            try:
+                loaded = model_registry.get(model_type)
+            except Exception as e:
+                out.write(json.dumps({**info, 'model_type': model_type, 'error': str(e)}) + '\n')
+                continue
+
+            df = pd.read_csv(args.csv) if args.csv else synthetic_frame(loaded, args.rows, seed=args.seed)
+            labels = df[args.label_column].astype(str).to_numpy() if args.label_column else None
+            print(f"{model_type}: {len(df)} rows", file=sys.stderr)
+            print(f"{'rounds':>6} {'threshold':>9} {'escalated':>9} {'agreement':>9} {'accuracy':>8} "
+                  f"{'predict rows/s':>14} {'rows/s':>10}", file=sys.stderr)
+            for record in curve(loaded, df, labels, args.rounds, args.thresholds, args.repeat):
+                accuracy = f"{record['accuracy']:.4f}" if record['accuracy'] is not None else '-'
+                print(f"{record['rounds'] or 'all':>6} {record['threshold'] or '-':>9} {record['escalated']:>9.1%} "
+                      f"{record['agreement']:>9.4f} {accuracy:>8} {record['predict_rows_per_second']:>14,.0f} "
+                      f"{record['rows_per_second']:>10,.0f}", file=sys.stderr)
+                out.write(json.dumps({**info, **record}) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import json
+from typing import Dict, Tuple
+
+from .run import STAGES
+
+Key = Tuple[str, int, float]
+
+
+def load_results(path: str) -> Dict[Key, dict]:
+    """Benchmark records by (model, rows, nan fraction); later runs in the file win"""
+    results = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if 'error' not in record and 'rows' in record:
+                results[(record['model_type'], record['rows'], record['nan_fraction'])] = record
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+    print(f"{'model':8} {'rows':>9} {'nan':>5} {'rows/s before':>14} {'rows/s after':>13} {'speedup':>8}  slowest stage")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        speedup = before['stage_seconds']['total'] / after['stage_seconds']['total']
+        slowest = max(STAGES, key=lambda name: after['stage_seconds'].get(name, 0.0))
+        model_type, rows, nan_fraction = key
+        print(f"{model_type:8} {rows:>9} {nan_fraction:>5.0%} {before['rows_per_second']:>14,.0f} "
+              f"{after['rows_per_second']:>13,.0f} {speedup:>7.2f}x  {slowest}")
+
+
+if __name__ == '__main__':
+    main()
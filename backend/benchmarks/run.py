@@ -0,0 +1,145 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from inference import model_registry
+from inference.formats import read_table
+from inference.profiling import record_stages
+from inference.synthetic import synthetic_frame
+
+DEFAULT_ROWS = [1, 100, 10_000, 100_000, 1_000_000]
+DEFAULT_NAN_FRACTIONS = [0.0, 0.5]
+STAGES = ['parse', 'preprocess', 'impute', 'scale', 'predict', 'output']
+
+
+def run_info() -> Dict[str, Any]:
+    """What a result depends on besides the code under test"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'run_id': uuid.uuid4().hex[:12],
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'host': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'xgboost': xgb.__version__,
+    }
+
+
+def run_once(loaded, csv_bytes: bytes) -> Dict[str, float]:
+    """Seconds per stage for one parse + predict of the payload"""
+    start = time.perf_counter()
+    df = read_table(io.BytesIO(csv_bytes), 'csv')
+    parsed = time.perf_counter()
+    with record_stages() as timings:
+        result = loaded.predict(df)
+    end = time.perf_counter()
+    if isinstance(result, str):  # Error message
+        raise RuntimeError(result)
+
+    timings['parse'] = parsed - start
+    # Overlap checks, wrapper bookkeeping: anything outside a marked stage
+    timings['other'] = max(end - parsed - sum(v for k, v in timings.items() if k != 'parse'), 0.0)
+    timings['total'] = end - start
+    return timings
+
+
+def peak_memory(loaded, csv_bytes: bytes) -> int:
+    """Peak bytes allocated through Python and numpy during one parse + predict.
+
+    Measured in a separate, untimed pass since tracing slows allocation
+    down. Allocations inside XGBoost's own C++ code are not traced.
+    """
+    tracemalloc.start()
+    try:
+        loaded.predict(read_table(io.BytesIO(csv_bytes), 'csv'))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(loaded, rows: int, nan_fraction: float, repeat: int, seed: int) -> Dict[str, Any]:
+    df = synthetic_frame(loaded, rows, nan_fraction, seed)
+    csv_bytes = df.to_csv(index=False).encode()
+    del df
+
+    runs = [run_once(loaded, csv_bytes) for _ in range(repeat)]
+    stages = {name: statistics.median(run.get(name, 0.0) for run in runs)
+              for name in STAGES + ['other', 'total']}
+    return {
+        'model_type': loaded.model_type,
+        'model_version': loaded.version,
+        'rows': rows,
+        'columns': len(csv_bytes.split(b'\n', 1)[0].split(b',')),
+        'nan_fraction': nan_fraction,
+        'input_bytes': len(csv_bytes),
+        'repeat': repeat,
+        # Median over the repeats, in seconds
+        'stage_seconds': {name: round(seconds, 6) for name, seconds in stages.items()},
+        'rows_per_second': round(rows / stages['total'], 1) if stages['total'] else None,
+        'peak_traced_bytes': peak_memory(loaded, csv_bytes),
+        # High-water mark of the whole process so far (KiB on Linux)
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark parse, preprocessing and inference per model.')
+    parser.add_argument('--models', nargs='+', default=model_registry.model_types)
+    parser.add_argument('--rows', nargs='+', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--nan-fraction', nargs='+', type=float, default=DEFAULT_NAN_FRACTIONS,
+                        help='share of input cells left empty, for sparse inputs')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='append JSON lines here instead of printing them')
+    args = parser.parse_args(argv)
+
+    info = run_info()
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for model_type in args.models:
+            try:
+                loaded = model_registry.get(model_type)
+            except Exception as e:
+                out.write(json.dumps({**info, 'model_type': model_type, 'error': str(e)}) + '\n')
+                continue
+
+            loaded.predict(synthetic_frame(loaded, 10, seed=args.seed))  # warm-up
+            for rows in args.rows:
+                for nan_fraction in args.nan_fraction:
+                    print(f"{model_type}: {rows} rows, {nan_fraction:.0%} NaN", file=sys.stderr)
+                    try:
+                        record = benchmark(loaded, rows, nan_fraction, args.repeat, args.seed)
+                    except Exception as e:
+                        record = {'model_type': model_type, 'rows': rows, 'nan_fraction': nan_fraction,
+                                  'error': str(e)}
+                    out.write(json.dumps({**info, **record}) + '\n')
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,88 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ALLOWED_TABLES = ['k2', 'toi', 'kepler']
 
+# Columns identifying a row across archive refreshes; materialized predictions are keyed by them
+NATURAL_KEYS = {
+    'k2': ['pl_name', 'pl_refname'],
+    'toi': ['toi'],
+    'kepler': ['kepoi_name'],
+}
+# Column the archive bumps when a row changes; kepler has none, so its rows are compared by content
+ROW_UPDATE_COLUMNS = {'k2': 'rowupdate', 'toi': 'rowupdate', 'kepler': None}
+# Side table holding the model predictions for the rows of the tables above
+PREDICTIONS_TABLE = 'model_predictions'
+
+def key_parts_sql(table_name, alias='t'):
+    """SQL expressions of a row's natural key columns as text, unqualified without an alias"""
+    prefix = f"{alias}." if alias else ''
+    return [f"COALESCE({prefix}{col}::text, '')" for col in NATURAL_KEYS[table_name]]
+
+def row_key_sql(table_name, alias='t'):
+    """SQL expression of a row's natural key as one text value"""
+    parts = key_parts_sql(table_name, alias)
+    return parts[0] if len(parts) == 1 else f"concat_ws('|', {', '.join(parts)})"
+
+def row_marker_sql(table_name, alias='t'):
+    """SQL expression that changes whenever the row changes"""
+    column = ROW_UPDATE_COLUMNS[table_name]
+    return f"{alias}.{column}::text" if column else f"md5({alias}::text)"
+
 # Use DATABASE_URL from .env
 DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
-engine = create_engine(DATABASE_URL)
\ No newline at end of file
+engine = create_engine(DATABASE_URL)
+
+# Unique row id added to the tables by `python database.py`; the tiebreaker of rows sharing a natural key
+ROW_ID_COLUMN = '_row_id'
+
+# Tables found to have their row id column
+_row_ids = set()
+
+def has_row_id(table_name):
+    """Whether the table has been migrated to have ROW_ID_COLUMN"""
+    if table_name not in _row_ids:
+        query = text("SELECT 1 FROM information_schema.columns WHERE table_name = :table_name AND column_name = :column")
+        with engine.connect() as conn:
+            if conn.execute(query, {'table_name': table_name, 'column': ROW_ID_COLUMN}).first() is None:
+                return False
+        _row_ids.add(table_name)
+    return True
+
+def migrate_row_keys(table_name):
+    """Add the row id column and the index table pages are read in, on the natural key parts then the row id.
+
+    A keyset page is then an index range scan however deep it is. Adding
+    the identity column rewrites the whole table under an ACCESS EXCLUSIVE
+    lock, blocking reads and writes until it is done, so run it in a
+    maintenance window; it is skipped on a table that already has the
+    column. The index is then built CONCURRENTLY, outside a transaction,
+    so the table stays readable and writable meanwhile; it replaces the
+    natural key index earlier versions created on first use. The row id is
+    left out of what the API returns.
+    """
+    columns = ', '.join(f"({part})" for part in key_parts_sql(table_name, alias=None))
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ROW_ID_COLUMN} "
+                          f"bigint GENERATED BY DEFAULT AS IDENTITY"))
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        try:
+            conn.execute(text(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table_name}_row_key_idx "
+                              f"ON {table_name} ({columns}, {ROW_ID_COLUMN})"))
+        except Exception:
+            # A failed concurrent build leaves an invalid index behind, which IF NOT EXISTS would then keep
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {table_name}_row_key_idx"))
+            raise
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {table_name}_natural_key_idx"))
+
+if __name__ == '__main__':
+    # python database.py: add row ids and page indexes to every table (locks each table while it is rewritten)
+    for table_name in ALLOWED_TABLES:
+        migrate_row_keys(table_name)
+        print(f"{table_name}: {ROW_ID_COLUMN} and {table_name}_row_key_idx in place")
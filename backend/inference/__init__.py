@@ -0,0 +1,3 @@
+from .registry import ModelRegistry, model_registry
+
+__all__ = ['ModelRegistry', 'model_registry']
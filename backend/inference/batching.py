@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# How long the first request of a batch waits for others to join while rows are queued behind it;
+# a lone request is dispatched at once. 0 disables batching
+BATCH_WINDOW_MS = float(os.getenv('PREDICT_BATCH_WINDOW_MS', 5))
+BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', 64))
+# Recent queue waits kept for the latency percentiles
+WAIT_SAMPLES = 1000
+
+
+class _PendingRow:
+    __slots__ = ('loaded', 'row', 'enqueued', 'done', 'result')
+
+    def __init__(self, loaded, row: Dict[str, float]):
+        self.loaded = loaded
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+
+
+class MicroBatcher:
+    """Collects single-row predictions for one model type and runs them as one matrix.
+
+    A row that finds the queue empty is run at once, so a lone request pays
+    no batching delay. Rows that queued up meanwhile are taken together, and
+    while there are such rows the batch waits up to `window_ms` from its
+    first row for more (up to `max_batch_size`); they share a single wrapper
+    call and each caller gets its own one-row result back. Only useful when
+    a worker serves concurrent requests (threaded gunicorn workers),
+    otherwise batches are always of size one.
+    Each row is scored by the model version its request started with, so
+    rows queued across a model swap are run as one batch per version.
+    """
+
+    def __init__(self, model_type: str, window_ms: float = BATCH_WINDOW_MS, max_batch_size: int = BATCH_MAX_SIZE):
+        self.model_type = model_type
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._rows = 0
+
+    def predict(self, loaded, row: Dict[str, float], timeout: float = 30.0):
+        self._ensure_started()
+        pending = _PendingRow(loaded, row)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            return f"{self.model_type.upper()} prediction timed out after {timeout:.0f}s"
+        return pending.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits = np.array(self._waits) * 1000.0
+            batches = sum(self._batch_sizes.values())
+            return {
+                'window_ms': self.window * 1000.0,
+                'max_batch_size': self.max_batch_size,
+                'rows': self._rows,
+                'batches': batches,
+                'mean_batch_size': round(self._rows / batches, 2) if batches else None,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': {
+                    'mean': round(float(waits.mean()), 3) if len(waits) else None,
+                    'p95': round(float(np.percentile(waits, 95)), 3) if len(waits) else None,
+                    'max': round(float(waits.max()), 3) if len(waits) else None,
+                },
+            }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=f'batcher-{self.model_type}', daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Only a batcher under load (rows already waiting together) holds the batch open for more
+            deadline = batch[0].enqueued + self.window if len(batch) > 1 else 0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            versions = {}
+            for pending in batch:
+                versions.setdefault(pending.loaded, []).append(pending)
+            for loaded, rows in versions.items():
+                self._run(loaded, rows)
+
+    def _run(self, loaded, batch):
+        started = time.perf_counter()
+        try:
+            result = loaded.predict(pd.DataFrame([p.row for p in batch]))
+            if isinstance(result, str) and len(batch) > 1:
+                # One bad row must not fail its neighbours: score them one by one
+                results = [loaded.predict(pd.DataFrame([p.row])) for p in batch]
+            elif isinstance(result, str):
+                results = [result]
+            else:
+                results = [result.iloc[[i]] for i in range(len(batch))]
+        except Exception as e:
+            results = [f"{self.model_type.upper()} prediction failed: {str(e)}"] * len(batch)
+
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._rows += len(batch)
+            self._waits.extend(started - p.enqueued for p in batch)
+
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending.done.set()
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_type: str) -> MicroBatcher:
+    with _batchers_lock:
+        if model_type not in _batchers:
+            _batchers[model_type] = MicroBatcher(model_type)
+        return _batchers[model_type]
+
+
+def predict_row(loaded, row: Dict[str, float]):
+    """Predict one feature row with a loaded model, micro-batched when it scores rows independently"""
+    if BATCH_WINDOW_MS > 0 and loaded.row_independent:
+        return get_batcher(loaded.model_type).predict(loaded, row)
+    return loaded.predict(pd.DataFrame([row]))
+
+
+def batching_stats() -> Dict[str, Any]:
+    with _batchers_lock:
+        return {model_type: batcher.stats() for model_type, batcher in _batchers.items()}
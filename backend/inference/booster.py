@@ -0,0 +1,65 @@
+import json
+import os
+import pickle
+import threading
+from typing import Tuple
+
+import numpy as np
+import xgboost as xgb
+
+from .flat_trees import use_flat_trees
+
+# Threads per native booster call; 0 lets XGBoost use every core
+PREDICT_NTHREAD = int(os.getenv('PREDICT_NTHREAD', 0))
+# The one objective whose inplace_predict gives the (rows, classes) probabilities predict_proba does
+PROBA_OBJECTIVE = 'multi:softprob'
+
+
+def load_booster(models_dir: str, pickle_name: str, shared, nthread: int = PREDICT_NTHREAD) -> xgb.Booster:
+    """Native Booster of a pickled XGBClassifier.
+
+    The booster is saved as UBJSON next to the shared arrays on first load, so
+    later processes read it directly instead of unpickling the sklearn
+    wrapper. The cache directory is keyed by the model files' hash, so a
+    replaced pickle is never served from a stale cache.
+    """
+    cache_path = os.path.join(shared.root, f"{os.path.splitext(pickle_name)[0]}.ubj")
+    if os.path.exists(cache_path):
+        booster = xgb.Booster(model_file=cache_path)
+    else:
+        with open(os.path.join(models_dir, pickle_name), "rb") as f:
+            model = pickle.load(f)
+        booster = model.get_booster()
+        os.makedirs(shared.root, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.ubj"
+        booster.save_model(tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    if nthread > 0:
+        booster.set_param({"nthread": nthread})
+    return booster
+
+
+def objective(booster: xgb.Booster) -> str:
+    return json.loads(booster.save_config())["learner"]["objective"]["name"]
+
+
+def gives_proba(booster: xgb.Booster) -> bool:
+    """Whether inplace_predict returns class probabilities; binary and multi:softmax boosters return 1-D output"""
+    return objective(booster) == PROBA_OBJECTIVE
+
+
+def iteration_range(booster: xgb.Booster) -> Tuple[int, int]:
+    """Trees XGBClassifier.predict_proba would use: up to best_iteration if early stopping set it"""
+    best_iteration = booster.attributes().get("best_iteration")
+    return (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+
+
+def predict_proba(booster: xgb.Booster, X: np.ndarray, flat=None) -> np.ndarray:
+    """Class probabilities of a multi:softprob booster in one in-place pass over X.
+
+    Small batches are scored by the booster's flattened trees when given.
+    """
+    if use_flat_trees(flat, len(X)):
+        return flat.predict_proba(X)
+    return booster.inplace_predict(X, iteration_range=iteration_range(booster))
@@ -0,0 +1,87 @@
+import os
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from .booster import PROBA_OBJECTIVE, gives_proba
+
+# Rows whose top class probability after the first rounds is below this go on to the
+# whole ensemble; 0 disables the cascade. PREDICT_CASCADE_THRESHOLD_<MODEL> overrides it per model
+DEFAULT_THRESHOLD = float(os.getenv('PREDICT_CASCADE_THRESHOLD', 0))
+# Boosting rounds of the cheap first stage
+DEFAULT_ROUNDS = int(os.getenv('PREDICT_CASCADE_ROUNDS', 50))
+# Smaller batches (single rows, micro-batches) are always scored by the whole ensemble
+MIN_ROWS = int(os.getenv('PREDICT_CASCADE_MIN_ROWS', 1000))
+
+# decided_by values of the output
+DECIDED_BY_CHEAP = 'cascade'
+DECIDED_BY_FULL = 'ensemble'
+DECIDED_BY = [DECIDED_BY_CHEAP, DECIDED_BY_FULL]
+
+
+class Cascade:
+    """The first boosting rounds of an ensemble as a cheap first stage.
+
+    Every row is scored by the first `rounds` rounds; only rows whose top
+    class probability stays below `threshold` are scored again by the
+    whole ensemble, so a batch costs about rounds/total of the trees plus
+    the share of ambiguous rows.
+    """
+
+    def __init__(self, booster: xgb.Booster, rounds: int, threshold: float, min_rows: int = MIN_ROWS):
+        self.booster = booster
+        self.rounds = rounds
+        self.threshold = threshold
+        self.min_rows = min_rows
+
+    def predict_proba(self, X: np.ndarray,
+                      full: Callable[[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, Optional[pd.Categorical]]:
+        """Class probabilities and the stage that decided each row (None when the cascade did not run)"""
+        if len(X) < self.min_rows:
+            return full(X), None
+
+        proba = np.array(self.booster.inplace_predict(X, iteration_range=(0, self.rounds)), dtype=np.float32)
+        unsure = proba.max(axis=1) < self.threshold
+        if unsure.any():
+            proba[unsure] = full(X[unsure])
+        return proba, pd.Categorical.from_codes(unsure.astype(np.int8), categories=DECIDED_BY)
+
+
+def cascade_settings(model_type: str) -> Tuple[int, float]:
+    threshold = float(os.getenv(f'PREDICT_CASCADE_THRESHOLD_{model_type.upper()}', DEFAULT_THRESHOLD))
+    return DEFAULT_ROUNDS, threshold
+
+
+def cascade_key(model_type: str) -> str:
+    """Cascade settings a model's predictions depend on, '' when it is disabled"""
+    rounds, threshold = cascade_settings(model_type)
+    return f"cascade:{rounds}:{threshold}:{MIN_ROWS}" if threshold > 0 else ''
+
+
+def compile_cascade(model_type: str, booster: xgb.Booster, iteration_range: Tuple[int, int]) -> Optional[Cascade]:
+    """Cascade of a multi-class booster, or None when disabled or the ensemble is not larger than its first stage.
+
+    The threshold is compared with class probabilities, so only multi:softprob
+    boosters get one; other objectives predict labels or a single column.
+    """
+    rounds, threshold = cascade_settings(model_type)
+    if threshold <= 0:
+        return None
+    if not gives_proba(booster):
+        print(f"{model_type}: cascade needs a {PROBA_OBJECTIVE} booster; not used")
+        return None
+    total = iteration_range[1] or booster.num_boosted_rounds()
+    if rounds >= total:
+        print(f"{model_type}: cascade of {rounds} rounds is not smaller than the {total}-round ensemble; not used")
+        return None
+    return Cascade(booster, rounds, threshold)
+
+
+def cascade_proba(cascade: Optional[Cascade], X: np.ndarray,
+                  full: Callable[[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, Optional[pd.Categorical]]:
+    """Probabilities through the cascade when the model has one, else from `full` alone"""
+    if cascade is None:
+        return full(X), None
+    return cascade.predict_proba(X, full)
@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Union
+
+import pandas as pd
+
+# Rows listed by a validation error, per feature
+ERROR_ROWS = 10
+
+
+def columnar_frame(payload: Dict[str, Any]) -> Union[pd.DataFrame, str]:
+    """Rows of a columnar JSON payload, or an error message.
+
+    Either {"columns": [...], "values": [[...], ...]} with one list per
+    row, or {"features": {"name": [...], ...}} with one list per feature.
+    """
+    if 'columns' in payload:
+        columns, values = payload.get('columns'), payload.get('values')
+        if not isinstance(columns, list) or not isinstance(values, list):
+            return '"columns" and "values" must be lists'
+        columns = [str(column) for column in columns]
+        if len(set(columns)) != len(columns):
+            return 'Column names must be unique'
+        if any(not isinstance(row, list) or len(row) != len(columns) for row in values):
+            return f'Every row of "values" must be a list of {len(columns)} values'
+        df = pd.DataFrame(values, columns=columns)
+    else:
+        features = payload.get('features')
+        if not isinstance(features, dict) or not features:
+            return 'Provide "columns" and "values", or "features" with one list of values per feature'
+        lists = list(features.values())
+        if any(not isinstance(v, list) for v in lists) or len({len(v) for v in lists}) != 1:
+            return 'Every feature must be a list of values, all of the same length'
+        df = pd.DataFrame({str(name): values for name, values in features.items()})
+
+    if df.empty:
+        return 'No rows provided'
+    return df
+
+
+def _row_list(mask: pd.Series) -> List[int]:
+    return mask[mask].index[:ERROR_ROWS].tolist()
+
+
+def feature_frame(df: pd.DataFrame, required: List[str]) -> Union[pd.DataFrame, str]:
+    """Numeric feature rows, or an error message naming the offending features and rows.
+
+    Required features need a number in every row, as in a manual request;
+    other columns are optional features, and values that are not numbers
+    are treated as missing there.
+    """
+    missing = [feature for feature in required if feature not in df.columns]
+    if missing:
+        return f'Missing required features: {missing}'
+
+    features, empty, invalid = {}, {}, {}
+    for column in df.columns:
+        values = df[column]
+        try:
+            numbers = pd.to_numeric(values, errors='coerce')
+        except (TypeError, ValueError):  # nested lists or objects
+            numbers = pd.Series(float('nan'), index=df.index)
+        if numbers.dtype == bool:
+            numbers = numbers.astype(float)
+        features[column] = numbers
+        if column not in required:
+            continue
+
+        blank = values.isna()
+        if values.dtype == object:
+            blank |= values.astype(str).str.strip() == ''
+        if blank.any():
+            empty[column] = _row_list(blank)
+        not_number = numbers.isna() & ~blank
+        if not_number.any():
+            invalid[column] = _row_list(not_number)
+
+    if empty:
+        return f'Missing values for required features (feature: rows): {empty}'
+    if invalid:
+        return f'Invalid values for required features, must be numbers (feature: rows): {invalid}'
+    return pd.DataFrame(features, index=df.index)
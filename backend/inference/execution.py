@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Union
+
+import pandas as pd
+
+CPU_COUNT = os.cpu_count() or 1
+# Cores model calls may keep busy at once, across all requests and jobs of this process
+CPU_SLOTS = int(os.getenv('PREDICT_CPU_SLOTS', CPU_COUNT))
+# Model calls expected to run at once, one per model type as in a type=auto prediction
+CONCURRENT_CALLS = int(os.getenv('PREDICT_CONCURRENT_CALLS', 3))
+# Threads per model call, by default a share of the slots so concurrent calls do not queue behind each other;
+# PREDICT_THREADS_<MODEL> (e.g. PREDICT_THREADS_K2) overrides it per model
+DEFAULT_THREADS = (int(os.getenv('PREDICT_THREADS', os.getenv('PREDICT_NTHREAD', 0)))
+                   or max(1, CPU_SLOTS // max(1, CONCURRENT_CALLS)))
+# Worker processes for sharding large inputs; 0 disables the process pool
+PROCESS_WORKERS = int(os.getenv('PREDICT_PROCESSES', 0))
+# Rows per process shard; smaller inputs are scored in the calling thread
+SHARD_ROWS = int(os.getenv('PREDICT_SHARD_ROWS', 100000))
+# 'threads' (the model's native threads) or 'processes'; PREDICT_MODE_<MODEL> overrides it per model
+DEFAULT_MODE = os.getenv('PREDICT_MODE', 'threads')
+EXECUTION_MODES = ('threads', 'processes')
+
+
+class CpuSlots:
+    """Counting semaphore over cores; a model call holds one slot per thread it runs"""
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._free = self.total
+        self._cond = threading.Condition()
+        self.waits = 0
+
+    @contextmanager
+    def hold(self, n: int) -> Iterator[int]:
+        n = max(1, min(n, self.total))
+        with self._cond:
+            if self._free < n:
+                self.waits += 1
+            self._cond.wait_for(lambda: self._free >= n)
+            self._free -= n
+        try:
+            yield n
+        finally:
+            with self._cond:
+                self._free += n
+                self._cond.notify_all()
+
+    def free(self) -> int:
+        return self._free
+
+
+def set_threads(artifacts: Dict[str, Any], threads: int):
+    """Cap the native threads of every model object among a wrapper's artifacts"""
+    for value in artifacts.values():
+        if hasattr(value, 'inplace_predict'):  # xgboost.Booster
+            value.set_param({'nthread': threads})
+        elif hasattr(value, 'get_booster'):  # XGBClassifier; set_params fails on ones pickled by older xgboost
+            value.get_booster().set_param({'nthread': threads})
+            value.n_jobs = threads
+        elif hasattr(value, 'n_jobs'):  # other sklearn estimators
+            value.n_jobs = threads
+
+
+def _predict_shard(model_type: str, version: str, threads: int, df: pd.DataFrame):
+    """Score one shard in a pool process, with the model loaded there from the shared artifacts"""
+    from .registry import model_registry
+    loaded = model_registry.get(model_type)
+    if loaded.version != version:
+        # Pool processes do not run the watcher; catch up with the swap made in the parent
+        loaded = model_registry.reload(model_type)
+    if loaded.version != version:
+        return f"{model_type} model changed during prediction, please retry"
+    set_threads(loaded.artifacts, threads)
+    return loaded.wrapper.predict(df, loaded)
+
+
+class ExecutionEngine:
+    """Runs wrapper predictions within the process's core budget.
+
+    A model call either uses the model's native threads, capped per model
+    and counted against CPU_SLOTS so concurrent requests queue instead of
+    oversubscribing the cores, or, for large inputs of models that score
+    rows independently, is split into SHARD_ROWS shards across a process
+    pool. The pool covers the single-threaded parts (parsing to a matrix,
+    output assembly) as well; each shard runs the model with one thread.
+    """
+
+    def __init__(self, cpu_slots: int = CPU_SLOTS, default_threads: int = DEFAULT_THREADS,
+                 processes: int = PROCESS_WORKERS, shard_rows: int = SHARD_ROWS, default_mode: str = DEFAULT_MODE):
+        self.slots = CpuSlots(cpu_slots)
+        self.default_threads = default_threads
+        self.processes = processes
+        self.shard_rows = shard_rows
+        self.default_mode = default_mode
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._configured = weakref.WeakKeyDictionary()  # LoadedModel -> threads applied
+
+    def threads_for(self, model_type: str, share: int = 1) -> int:
+        """Threads of one call, when `share` calls run side by side each within its part of the slots"""
+        threads = int(os.getenv(f'PREDICT_THREADS_{model_type.upper()}', 0)) or self.default_threads
+        return max(1, min(threads, self.slots.total // max(1, share)))
+
+    def mode_for(self, model_type: str) -> str:
+        mode = os.getenv(f'PREDICT_MODE_{model_type.upper()}', self.default_mode)
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Invalid execution mode for {model_type}: {mode}")
+        return mode
+
+    def settings(self, model_type: str) -> Dict[str, Any]:
+        """How calls to this model are executed, as reported with job results"""
+        return {
+            'mode': self.mode_for(model_type),
+            'threads': self.threads_for(model_type),
+            'processes': self.processes,
+            'shard_rows': self.shard_rows,
+            'cpu_slots': self.slots.total,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cpu_slots': self.slots.total,
+            'free_slots': self.slots.free(),
+            'slot_waits': self.slots.waits,
+            'processes': self.processes,
+            'shard_rows': self.shard_rows,
+        }
+
+    def predict(self, loaded, df: pd.DataFrame, share: int = 1) -> Union[pd.DataFrame, str]:
+        if self._shardable(loaded, df):
+            return self._predict_sharded(loaded, df)
+
+        threads = self.threads_for(loaded.model_type, share)
+        if self._configured.get(loaded) != threads:
+            set_threads(loaded.artifacts, threads)
+            self._configured[loaded] = threads
+        with self.slots.hold(threads):
+            return loaded.wrapper.predict(df, loaded)
+
+    def _shardable(self, loaded, df: pd.DataFrame) -> bool:
+        # Models with batch-dependent preprocessing (TOI without stored fences) must see the whole input
+        return (self.processes > 0 and len(df) > self.shard_rows and loaded.row_independent
+                and self.mode_for(loaded.model_type) == 'processes')
+
+    def _predict_sharded(self, loaded, df: pd.DataFrame) -> Union[pd.DataFrame, str]:
+        starts = range(0, len(df), self.shard_rows)
+        with self.slots.hold(min(len(starts), self.processes)):
+            pool = self._get_pool()
+            futures = [pool.submit(_predict_shard, loaded.model_type, loaded.version, 1,
+                                   df.iloc[start:start + self.shard_rows])
+                       for start in starts]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            if isinstance(result, str):  # Error message
+                return result
+        return pd.concat(results)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # spawn: forking a process that runs request threads can copy held locks
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+
+# Global execution engine, used by LoadedModel.predict
+execution_engine = ExecutionEngine()
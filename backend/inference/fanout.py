@@ -0,0 +1,97 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+from .registry import LoadedModel, model_registry
+
+# type=auto scores the upload with every model whose input features it covers
+AUTO_MODEL_TYPE = 'auto'
+FANOUT_WORKERS = int(os.getenv('PREDICT_FANOUT_WORKERS', 3))
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='predict-fanout')
+
+
+def available_models() -> Tuple[Dict[str, LoadedModel], Dict[str, str]]:
+    """Every model type that loads in this process, and the load error of the others"""
+    models, errors = {}, {}
+    for model_type in model_registry.model_types:
+        try:
+            models[model_type] = model_registry.get(model_type)
+        except Exception as e:
+            errors[model_type] = str(e)
+    return models, errors
+
+
+def models_version(models: Dict[str, LoadedModel]) -> str:
+    """One version for a set of models, changes when any of them is replaced"""
+    digest = hashlib.sha256()
+    for model_type in sorted(models):
+        digest.update(f"{model_type}:{models[model_type].version};".encode())
+    return digest.hexdigest()[:12]
+
+
+def match_models(columns, models: Dict[str, LoadedModel]) -> Dict[str, Dict[str, Any]]:
+    """How many of each model's input features the upload's columns cover"""
+    columns = set(columns)
+    matches = {}
+    for model_type, loaded in models.items():
+        overlap = len(columns.intersection(loaded.artifacts['input_features']))
+        min_overlap = getattr(loaded.wrapper, 'MIN_OVERLAP', 10)
+        matches[model_type] = {
+            'overlap': overlap,
+            'min_overlap': min_overlap,
+            'qualifies': overlap >= min_overlap,
+            'model_version': loaded.version,
+        }
+    return matches
+
+
+def no_match_error(matches: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """Error message when no model qualifies, else None"""
+    if any(match['qualifies'] for match in matches.values()):
+        return None
+    found = ', '.join(f"{t}: {m['overlap']}/{m['min_overlap']}" for t, m in matches.items())
+    return f"No model recognises enough columns in this file ({found or 'no models loaded'})"
+
+
+def predict_all(df: pd.DataFrame, models: Dict[str, LoadedModel]) -> Union[Tuple[pd.DataFrame, Dict[str, Any]], str]:
+    """Run every qualifying model on the same parsed frame, in parallel.
+
+    Returns the input with `{model}_predicted_class`, `{model}_confidence`,
+    `{model}_prob_*` (and with the cascade, `{model}_decided_by`) columns
+    appended, plus a per-model summary; or an error message when no model
+    qualifies or all of them fail.
+    """
+    matches = match_models(df.columns, models)
+    qualifying = [model_type for model_type, match in matches.items() if match['qualifies']]
+    if not qualifying:
+        return no_match_error(matches)
+
+    # The wrappers only read df, so the threads can share it; XGBoost releases the GIL.
+    # Each model runs within its share of the core slots, so the calls overlap instead of queueing
+    futures = {model_type: _executor.submit(models[model_type].predict, df, len(qualifying))
+               for model_type in qualifying}
+
+    blocks = []
+    for model_type, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            result = f"{model_type.upper()} prediction failed: {str(e)}"
+        if isinstance(result, str):  # Error message
+            matches[model_type]['error'] = result
+            continue
+
+        output_columns = [c for c in result.columns
+                          if c in ('predicted_class', 'confidence', 'decided_by') or c.startswith('prob_')]
+        block = result[output_columns].rename(columns=lambda c: f"{model_type}_{c}")
+        blocks.append(block.set_axis(df.index))
+        counts = result['predicted_class'].value_counts()
+        matches[model_type]['class_counts'] = {str(k): int(v) for k, v in counts.items() if v}
+
+    if not blocks:
+        return '; '.join(matches[model_type]['error'] for model_type in qualifying)
+    return pd.concat([df] + blocks, axis=1), matches
@@ -0,0 +1,172 @@
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+import xgboost as xgb
+
+# Batches up to this many rows are scored by walking the flattened trees in NumPy;
+# larger ones go to the native library, whose per-call overhead is then amortized
+FLAT_TREES_MAX_ROWS = int(os.getenv('FLAT_TREES_MAX_ROWS', 64))
+# Rows verification_rows() builds to compare the compiled ensemble with the booster
+VERIFY_ROWS = 512
+
+SOFTMAX_OBJECTIVES = ('multi:softprob', 'multi:softmax')
+
+
+class FlatEnsemble:
+    """A gbtree booster exported to flat node arrays, evaluated with NumPy.
+
+    All trees share one set of node arrays and a tree is the index of its
+    root. A batch is evaluated for every tree at once, one tree level per
+    step. Each step is a handful of gathers: a node's right child is its
+    left child + 1 (XGBoost's node layout), and missing values are resolved
+    by reading the feature from a copy of the input with NaN as +inf (goes
+    right) or -inf (goes left), picked by the node's default direction.
+    Leaves have a NaN threshold and step to themselves.
+    """
+
+    ARRAYS = ('split', 'threshold', 'left', 'value', 'roots', 'class_matrix')
+
+    def __init__(self, split, threshold, left, value, roots, class_matrix,
+                 n_features: int, base_margin: float, depth: int, objective: str):
+        self.split = split  # feature index, + n_features where missing values go left
+        self.threshold = threshold
+        self.left = left
+        self.value = value
+        self.roots = roots
+        self.class_matrix = class_matrix  # (trees, classes) one-hot of each tree's output group
+        self.n_features = n_features
+        self.base_margin = base_margin
+        self.depth = depth
+        self.objective = objective
+
+    @classmethod
+    def from_booster(cls, booster: xgb.Booster, iteration_range: Tuple[int, int] = (0, 0)) -> 'FlatEnsemble':
+        model = json.loads(booster.save_raw('json'))
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective not in SOFTMAX_OBJECTIVES + ('binary:logistic',):
+            raise ValueError(f"Objective {objective} is not supported")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError(f"Booster {learner['gradient_booster']['name']} is not supported")
+
+        gbtree = learner['gradient_booster']['model']
+        begin, end = iteration_range
+        indptr = gbtree['iteration_indptr']
+        end = end or len(indptr) - 1
+        trees = gbtree['trees'][indptr[begin]:indptr[end]]
+        tree_info = gbtree['tree_info'][indptr[begin]:indptr[end]]
+        n_classes = int(learner['learner_model_param']['num_class']) or 1
+        n_features = booster.num_features()
+
+        split, threshold, left, value, roots = [], [], [], [], []
+        depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise ValueError("Categorical splits are not supported")
+            tree_left = np.asarray(tree['left_children'], dtype=np.int32)
+            tree_right = np.asarray(tree['right_children'], dtype=np.int32)
+            leaf = tree_left == -1
+            if (tree_right[~leaf] != tree_left[~leaf] + 1).any():
+                raise ValueError("Trees with non-adjacent children are not supported")
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+            default_left = np.asarray(tree['default_left'], dtype=bool)
+
+            own = np.arange(offset, offset + len(tree_left), dtype=np.int32)
+            split.append(np.where(leaf, 0, np.asarray(tree['split_indices']) + n_features * default_left))
+            threshold.append(np.where(leaf, np.float32(np.nan), conditions))
+            left.append(np.where(leaf, own - 1, tree_left + offset))
+            value.append(np.where(leaf, conditions, 0))
+            roots.append(offset)
+            depth = max(depth, _tree_depth(tree_left, tree_right))
+            offset += len(tree_left)
+
+        class_matrix = np.zeros((len(trees), n_classes), dtype=np.float32)
+        class_matrix[np.arange(len(trees)), tree_info] = 1
+
+        base_score = learner['learner_model_param']['base_score'].strip('[]').split(',')[0]
+        base_margin = float(base_score)
+        if objective == 'binary:logistic':
+            base_margin = float(np.log(base_margin / (1 - base_margin)))
+
+        return cls(
+            np.concatenate(split).astype(np.intp), np.concatenate(threshold).astype(np.float32),
+            np.concatenate(left).astype(np.intp), np.concatenate(value).astype(np.float32),
+            np.asarray(roots, dtype=np.intp), class_matrix, n_features, base_margin, depth, objective,
+        )
+
+    def share(self, shared, prefix: str = 'flat_trees') -> 'FlatEnsemble':
+        for name in self.ARRAYS:
+            setattr(self, name, shared.share(f"{prefix}_{name}", getattr(self, name)))
+        return self
+
+    def margins(self, X: np.ndarray) -> np.ndarray:
+        # XGBoost compares float32 features against float32 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        missing = np.isnan(X)
+        both = np.concatenate([np.where(missing, np.inf, X), np.where(missing, -np.inf, X)], axis=1)
+        flat = both.ravel()
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        row_offset = (np.arange(len(X)) * both.shape[1])[:, None]
+        for _ in range(self.depth):
+            goes_right = ~(flat[row_offset + self.split[nodes]] < self.threshold[nodes])
+            nodes = self.left[nodes] + goes_right
+        return self.value[nodes] @ self.class_matrix + np.float32(self.base_margin)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, float32 as XGBClassifier.predict_proba returns them"""
+        margins = self.margins(X).astype(np.float64)
+        if self.objective == 'binary:logistic':
+            positive = 1 / (1 + np.exp(-margins[:, 0]))
+            return np.column_stack([1 - positive, positive]).astype(np.float32)
+        margins -= margins.max(axis=1, keepdims=True)
+        exp = np.exp(margins)
+        return (exp / exp.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level for child in (left[node], right[node]) if child != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+def verification_rows(ensemble: FlatEnsemble, n_features: int, rows: int = VERIFY_ROWS, seed: int = 0) -> np.ndarray:
+    """Inputs that land on both sides of the trees' thresholds, and on missing values"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, n_features))
+    feature = ensemble.split % n_features
+    for j in range(n_features):
+        thresholds = ensemble.threshold[~np.isnan(ensemble.threshold) & (feature == j)]
+        if len(thresholds):
+            picks = rng.choice(thresholds, rows)
+            X[:, j] = picks + rng.choice([-1, 0, 1], rows) * np.maximum(np.abs(picks), 1) * 1e-3
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+def compile_flat_trees(booster: xgb.Booster, iteration_range: Tuple[int, int], shared,
+                       prefix: str = 'flat_trees') -> Optional[FlatEnsemble]:
+    """Flattened copy of a booster, or None when its trees are not supported.
+
+    Agreement with the booster is covered by tests/test_flat_trees.py rather
+    than checked on every load. Disabled with FLAT_TREES_MAX_ROWS=0.
+    """
+    if FLAT_TREES_MAX_ROWS <= 0:
+        return None
+    try:
+        ensemble = FlatEnsemble.from_booster(booster, iteration_range)
+    except ValueError as e:
+        print(f"Trees not flattened ({e}); using the booster for every batch")
+        return None
+    return ensemble.share(shared, prefix)
+
+
+def use_flat_trees(flat: Optional[FlatEnsemble], n_rows: int) -> bool:
+    """Whether a batch is small enough for the flattened trees, when the model has them"""
+    return flat is not None and n_rows <= FLAT_TREES_MAX_ROWS
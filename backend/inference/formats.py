@@ -0,0 +1,403 @@
+import itertools
+import os
+from typing import Callable, Collection, Iterator, List, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Upload extensions, and the ones that can be read (and predicted) chunk by chunk
+INPUT_FORMATS = {'csv', 'xlsx', 'xls', 'parquet', 'feather', 'arrow'}
+CHUNKED_FORMATS = {'csv', 'xlsx', 'parquet', 'feather', 'arrow'}
+# Result file formats for format=; feather files are Arrow IPC files
+RESULT_FORMATS = ('csv', 'parquet', 'feather')
+# columns= of a prediction: every upload column (the default) or the model's input columns only, in the result
+OUTPUT_COLUMNS = ('model', 'all')
+# Rows per chunk when a whole CSV or xlsx upload is parsed into memory; only one
+# chunk is held at full float64 width at a time
+PARSE_CHUNK_ROWS = 10000
+# Rows a Parquet/Feather result buffers while a column is still all missing and has no type
+SCHEMA_BUFFER_ROWS = int(os.getenv('RESULT_SCHEMA_BUFFER_ROWS', 200000))
+
+
+def rewind(source):
+    """Back to the start of an upload buffer; paths are reopened by every reader"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _xlsx_columns(header) -> List[str]:
+    return [f"Unnamed: {i}" if c is None else c for i, c in enumerate(header)]
+
+
+def read_header(source, file_ext: str) -> List[str]:
+    """Column names of an upload, as the readers below name them, without parsing its rows"""
+    try:
+        if file_ext == 'csv':
+            return pd.read_csv(source, comment='#', nrows=0).columns.tolist()
+        if file_ext == 'parquet':
+            return pq.ParquetFile(source).schema_arrow.names
+        if file_ext in ('feather', 'arrow'):
+            return pa.ipc.open_file(source).schema.names
+        if file_ext == 'xlsx':
+            workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+            try:
+                header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+            finally:
+                workbook.close()
+            return _xlsx_columns(header)
+        return pd.read_excel(source, nrows=0).columns.tolist()  # xls
+    finally:
+        rewind(source)
+
+
+def select_columns(header: List[str], model_columns: Collection[str],
+                   all_columns: bool = False) -> Tuple[Optional[List[str]], List[str]]:
+    """usecols and float_columns for reading an upload with `header` for a model reading `model_columns`"""
+    model_columns = set(model_columns)
+    float_columns = [c for c in header if c in model_columns]
+    return (None if all_columns else float_columns), float_columns
+
+
+def _csv_reader(source, chunk_rows: int, usecols, dtype):
+    return pd.read_csv(source, on_bad_lines="skip", comment='#', chunksize=chunk_rows,
+                       usecols=usecols, dtype=dtype)
+
+
+def read_csv_chunks(source, chunk_rows: int, usecols: Optional[Collection[str]] = None,
+                    float_columns: Collection[str] = ()) -> Iterator[pd.DataFrame]:
+    """Same parser options as the in-memory upload path, one chunk at a time.
+
+    Only `usecols` (upload columns, all of them when None) are parsed,
+    and `float_columns` straight to float64 instead of having their type
+    inferred. Should one of them hold text after all, the file is read
+    again from the first row not yet returned with inferred types, and the
+    text in those columns becomes NaN, so every chunk has the same float64
+    columns (which a Parquet or Feather result needs) and the wrappers see
+    what pd.to_numeric(errors='coerce') makes of the values.
+    """
+    dtype = dict.fromkeys(float_columns, np.float64) or None
+    returned = 0
+    try:
+        for chunk in _csv_reader(source, chunk_rows, usecols, dtype):
+            returned += len(chunk)
+            yield chunk
+        return
+    except ValueError:
+        if dtype is None:
+            raise
+
+    rewind(source)
+    for chunk in _csv_reader(source, chunk_rows, usecols, None):
+        if returned >= len(chunk):
+            returned -= len(chunk)
+            continue
+        chunk = chunk.iloc[returned:]
+        returned = 0
+        yield chunk.assign(**{
+            column: pd.to_numeric(chunk[column], errors='coerce').astype(np.float64)
+            for column in float_columns
+        })
+
+
+def read_xlsx_chunks(source, chunk_rows: int, usecols: Optional[Collection[str]] = None) -> Iterator[pd.DataFrame]:
+    """First worksheet through openpyxl's read-only reader, chunk_rows rows at a time.
+
+    Cells are read as plain values without building Cell objects, and only
+    one chunk of rows is held at a time. Blank rows are skipped, as
+    pd.read_excel does.
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _xlsx_columns(header)
+        width = len(columns)
+        keep = [i for i, c in enumerate(columns) if usecols is None or c in usecols]
+
+        while True:
+            block = list(itertools.islice(rows, chunk_rows))
+            if not block:
+                break
+            records = [row[:width] + (None,) * (width - len(row))
+                       for row in block if any(v is not None for v in row)]
+            yield pd.DataFrame.from_records([tuple(record[i] for i in keep) for record in records],
+                                            columns=[columns[i] for i in keep])
+    finally:
+        workbook.close()
+
+
+def read_arrow_chunks(source, file_ext: str, chunk_rows: int,
+                      usecols: Optional[Collection[str]] = None) -> Iterator[pd.DataFrame]:
+    """Record batches of a Parquet or Arrow IPC (Feather v2) file as DataFrames"""
+    if file_ext == 'parquet':
+        parquet = pq.ParquetFile(source)
+        columns = None if usecols is None else [c for c in parquet.schema_arrow.names if c in usecols]
+        batches = parquet.iter_batches(batch_size=chunk_rows, columns=columns)
+    else:
+        reader = pa.ipc.open_file(source)
+        columns = None if usecols is None else [c for c in reader.schema.names if c in usecols]
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if columns is not None:
+            batches = (pa.Table.from_batches([batch]).select(columns) for batch in batches)
+
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_rows):
+            yield batch.slice(start, chunk_rows).to_pandas()
+
+
+def read_chunks(source, file_ext: str, chunk_rows: int, usecols: Optional[Collection[str]] = None,
+                float_columns: Collection[str] = ()) -> Iterator[pd.DataFrame]:
+    """Upload chunks; usecols and float_columns as for read_csv_chunks, Excel and Arrow files keep their cell types"""
+    if file_ext == 'csv':
+        return read_csv_chunks(source, chunk_rows, usecols, float_columns)
+    if file_ext == 'xlsx':
+        return read_xlsx_chunks(source, chunk_rows, usecols)
+    if file_ext in ('parquet', 'feather', 'arrow'):
+        return read_arrow_chunks(source, file_ext, chunk_rows, usecols)
+    raise ValueError(f"{file_ext} files cannot be read in chunks")
+
+
+def read_table(source, file_ext: str, usecols: Optional[Collection[str]] = None,
+               float_columns: Collection[str] = ()) -> pd.DataFrame:
+    """Read a whole upload based on extension; usecols and float_columns as for read_chunks.
+
+    CSV and xlsx uploads are parsed in chunks that are downcast (see
+    downcast_numeric) before the next one is read, so a float64 column
+    that fits in float32 is only ever held at full width for one chunk.
+    Parquet and Arrow files keep the types they were written with.
+    """
+    if file_ext in ('csv', 'xlsx'):
+        chunks = [downcast_numeric(chunk)
+                  for chunk in read_chunks(source, file_ext, PARSE_CHUNK_ROWS, usecols, float_columns)]
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    if file_ext == 'parquet':
+        columns = None if usecols is None else [c for c in read_header(source, file_ext) if c in usecols]
+        return pd.read_parquet(source, columns=columns)
+    if file_ext in ('feather', 'arrow'):
+        columns = None if usecols is None else [c for c in read_header(source, file_ext) if c in usecols]
+        return pd.read_feather(source, columns=columns)
+    columns = None if usecols is None else (lambda c: c in usecols)
+    return pd.read_excel(source, usecols=columns)  # xls
+
+
+def downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Numeric columns in the smallest dtype that holds every value exactly.
+
+    Integer columns shrink to the narrowest integer type, float64 columns
+    become float32 when each value survives the round trip unchanged
+    (counts, flags, years, values with few significant bits). Other
+    columns keep float64: decimal fractions are rarely exact in float32,
+    and the models must see the same inputs the training pipeline saw.
+    Chunks that disagree are widened again when concatenated.
+    """
+    if not df.columns.is_unique:
+        return df
+    narrow = {}
+    for column, dtype in df.dtypes.items():
+        if dtype.kind == 'i' and dtype.itemsize > 1:
+            narrow[column] = pd.to_numeric(df[column], downcast='integer').dtype
+        elif dtype == np.float64:
+            values = df[column].to_numpy()
+            if np.array_equal(values.astype(np.float32), values, equal_nan=True):
+                narrow[column] = np.float32
+    narrow = {column: dtype for column, dtype in narrow.items() if dtype != df.dtypes[column]}
+    if not narrow:
+        return df
+    # astype leaves one block per narrowed column; copying consolidates them, so the
+    # prediction output can later reference the input's blocks instead of merging them
+    return df.astype(narrow).copy()
+
+
+def count_rows(path: str, file_ext: str) -> int:
+    """Row count used for job progress, from file metadata where the format has it"""
+    if file_ext == 'parquet':
+        return pq.ParquetFile(path).metadata.num_rows
+    if file_ext in ('feather', 'arrow'):
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    if file_ext == 'xlsx':
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return max((workbook.worksheets[0].max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+    return count_csv_rows(path)
+
+
+def count_csv_rows(path: str) -> int:
+    """Fast upper-bound row count (newlines minus the header) used for progress"""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def write_result(df: pd.DataFrame, path: str, result_format: str = 'csv'):
+    if result_format == 'parquet':
+        df.to_parquet(path, index=False)
+    elif result_format == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+class ResultWriter:
+    """Appends prediction chunks to one result file.
+
+    Parquet and Feather need one schema for the whole file. Each column
+    takes its type from the first chunk where it has a value: integer
+    columns widened to float64, because a later chunk with a missing value
+    in the same column arrives as float, and categorical columns stored as
+    their values, because an Arrow file holds one dictionary per column and
+    a later chunk may have other categories. Chunks are buffered until
+    every column has a value, up to SCHEMA_BUFFER_ROWS rows; a column still
+    empty then is written as text, which any later value can be cast to.
+    """
+
+    def __init__(self, path: str, result_format: str = 'csv'):
+        self.path = path
+        self.result_format = result_format
+        self._file = None
+        self._writer = None
+        self._schema = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, df: pd.DataFrame):
+        if self.result_format == 'csv':
+            first = self._file is None
+            if first:
+                self._file = open(self.path, 'w', newline='')
+            df.to_csv(self._file, header=first, index=False)
+            return
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._schema is not None:
+            self._writer.write_table(table.cast(self._schema))
+            return
+
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        if self._pending_rows >= SCHEMA_BUFFER_ROWS or all(
+                field is not None for field in self._typed_fields()):
+            self._open()
+
+    def _typed_fields(self):
+        """Each column's field from the first buffered chunk where it has a value, None if it has none yet"""
+        fields = []
+        for i, name in enumerate(self._pending[0].column_names):
+            field = None
+            for table in self._pending:
+                column = table.column(i)
+                if column.null_count < len(column) and not pa.types.is_null(column.type):
+                    field = table.schema.field(i)
+                    break
+            if field is not None and pa.types.is_integer(field.type):
+                field = field.with_type(pa.float64())
+            elif field is not None and pa.types.is_dictionary(field.type):
+                field = field.with_type(field.type.value_type)
+            fields.append(field)
+        return fields
+
+    def _open(self):
+        names = self._pending[0].column_names
+        self._schema = pa.schema([
+            field if field is not None else pa.field(name, pa.string())
+            for name, field in zip(names, self._typed_fields())
+        ])
+        if self.result_format == 'parquet':
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(self.path, self._schema)
+        for table in self._pending:
+            self._writer.write_table(table.cast(self._schema))
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        if self._pending:
+            self._open()
+        if self._file is not None:
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        elif self.result_format == 'csv':
+            open(self.path, 'w').close()  # no rows at all
+        else:
+            write_result(pd.DataFrame(), self.path, self.result_format)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_result_rows(path: str, result_format: str, offset: int = 0, limit: Optional[int] = None,
+                     columns: Optional[Callable[[str], bool]] = None,
+                     chunk_rows: int = 10000) -> Iterator[pd.DataFrame]:
+    """Rows offset .. offset+limit of a stored result file, chunk by chunk.
+
+    Parquet row groups and Arrow record batches before the offset are
+    skipped from their metadata without being read, and CSV rows before it
+    are skipped without being parsed. `columns` selects columns by name.
+    """
+    stop = None if limit is None else offset + limit
+    if result_format == 'csv':
+        try:
+            # A callable, unlike range(1, offset + 1), skips rows without holding a set of every skipped index
+            reader = pd.read_csv(path, skiprows=lambda i: 0 < i <= offset, usecols=columns, chunksize=chunk_rows)
+        except pd.errors.EmptyDataError:
+            return
+        remaining = limit
+        for chunk in reader:
+            if remaining is not None:
+                chunk = chunk.iloc[:remaining]
+                remaining -= len(chunk)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+            if remaining == 0:
+                break
+        return
+
+    with pa.memory_map(path) as source:
+        if result_format == 'parquet':
+            parquet = pq.ParquetFile(source)
+            names = [c for c in parquet.schema_arrow.names if columns is None or columns(c)]
+            blocks = [(parquet.metadata.row_group(i).num_rows,
+                       lambda i=i: parquet.read_row_group(i, columns=names))
+                      for i in range(parquet.num_row_groups)]
+        else:
+            reader = pa.ipc.open_file(source)
+            names = [c for c in reader.schema.names if columns is None or columns(c)]
+            blocks = [(reader.get_batch(i).num_rows, lambda i=i: reader.get_batch(i).select(names))
+                      for i in range(reader.num_record_batches)]
+
+        position = 0
+        for num_rows, load in blocks:
+            end = position + num_rows
+            if end > offset and (stop is None or position < stop):
+                block = load()
+                first = max(offset - position, 0)
+                last = num_rows if stop is None else min(stop - position, num_rows)
+                for start in range(first, last, chunk_rows):
+                    chunk = block.slice(start, min(chunk_rows, last - start)).to_pandas()
+                    chunk.index = pd.RangeIndex(position + start, position + start + len(chunk))
+                    yield chunk
+            position = end
+            if stop is not None and position >= stop:
+                break
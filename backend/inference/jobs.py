@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+JOBS_FOLDER = os.getenv('JOBS_FOLDER', os.path.join('uploads', 'jobs'))
+MAX_WORKERS = int(os.getenv('PREDICT_JOB_WORKERS', 2))
+MAX_PENDING = int(os.getenv('PREDICT_JOB_MAX_PENDING', 16))
+# Minimum seconds between progress writes to the job record
+PROGRESS_INTERVAL = 0.5
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobProgress:
+    """Handed to a running job so it can report rows done"""
+
+    def __init__(self, manager: 'JobManager', job_id: str):
+        self._manager = manager
+        self._job_id = job_id
+        self._last_write = 0.0
+
+    def set_total(self, total_rows: int):
+        self._manager._update(self._job_id, total_rows=int(total_rows))
+
+    def update(self, rows_done: int):
+        now = time.time()
+        if now - self._last_write >= PROGRESS_INTERVAL:
+            self._last_write = now
+            self._manager._update(self._job_id, rows_done=int(rows_done))
+
+
+class JobManager:
+    """Bounded pool of background prediction jobs.
+
+    Job records are JSON files in JOBS_FOLDER so that any worker process can
+    answer status requests, not only the one running the job.
+    """
+
+    def __init__(self, folder: str = JOBS_FOLDER, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING):
+        self.folder = folder
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='predict-job')
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def submit(self, job_id: str, fn: Callable[[JobProgress], Dict[str, Any]], **meta) -> Dict[str, Any]:
+        """Queue fn(progress); its return value becomes the job's result"""
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise JobQueueFull(f"Too many prediction jobs in progress ({self._active}), try again later")
+            self._active += 1
+
+        record = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'rows_done': 0,
+            'total_rows': None,
+            'result': None,
+            'error': None,
+            **meta,
+        }
+        self._write(record)
+        self._executor.submit(self._run, job_id, fn)
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def progress(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Rows done, percent and ETA derived from a job record"""
+        rows_done = record['rows_done']
+        total_rows = record['total_rows']
+        percent = None
+        eta_seconds = None
+
+        if record['status'] == 'completed':
+            percent, eta_seconds = 100.0, 0.0
+        elif total_rows:
+            percent = round(min(rows_done / total_rows, 1.0) * 100, 1)
+            if record['started_at'] and rows_done:
+                elapsed = time.time() - record['started_at']
+                eta_seconds = round(max(total_rows - rows_done, 0) * elapsed / rows_done, 1)
+
+        return {
+            'job_id': record['job_id'],
+            'status': record['status'],
+            'rows_done': rows_done,
+            'total_rows': total_rows,
+            'percent': percent,
+            'eta_seconds': eta_seconds,
+        }
+
+    def _run(self, job_id: str, fn):
+        try:
+            self._update(job_id, status='running', started_at=time.time())
+            result = fn(JobProgress(self, job_id))
+            if isinstance(result, str):  # Error message from the wrapper
+                self._update(job_id, status='failed', error=result, finished_at=time.time())
+            else:
+                self._update(job_id, status='completed', result=result, finished_at=time.time(),
+                             rows_done=result.get('rows_processed', 0))
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            record = self.get(job_id) or {'job_id': job_id}
+            record.update(changes)
+            self._write(record)
+
+    def _write(self, record: Dict[str, Any]):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(record['job_id'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.folder, f"{job_id}.json")
+
+
+# Global job manager instance
+job_manager = JobManager()
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, DateTime, Float, MetaData, Table, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB, insert
+
+from database import engine, ALLOWED_TABLES, PREDICTIONS_TABLE, row_key_sql, row_marker_sql
+from .execution import execution_engine
+from .registry import model_registry
+
+# Rows read, scored and upserted per step
+MATERIALIZE_CHUNK_ROWS = int(os.getenv('MATERIALIZE_CHUNK_ROWS', 20000))
+
+metadata = MetaData()
+
+# One row per (table, natural key, model version). row_marker is the source row's
+# rowupdate (or content hash) when it was scored, so changed rows can be found
+predictions_table = Table(
+    PREDICTIONS_TABLE, metadata,
+    Column('table_name', Text, primary_key=True),
+    Column('model_version', Text, primary_key=True),
+    Column('row_key', Text, primary_key=True),
+    Column('row_marker', Text),
+    Column('predicted_class', Text),
+    Column('confidence', Float),
+    Column('probabilities', JSONB),
+    Column('scored_at', DateTime, nullable=False, server_default=func.now()),
+)
+
+
+def ensure_predictions_table():
+    metadata.create_all(engine, checkfirst=True)
+
+
+def _stale_rows_sql(table_name: str) -> str:
+    """Rows with no prediction for the model version, or changed since they were scored"""
+    key = row_key_sql(table_name)
+    marker = row_marker_sql(table_name)
+    return f"""
+        SELECT t.*, {key} AS _row_key, {marker} AS _row_marker
+        FROM {table_name} t
+        LEFT JOIN {PREDICTIONS_TABLE} p
+            ON p.table_name = :table_name AND p.model_version = :model_version AND p.row_key = {key}
+        WHERE p.row_key IS NULL OR p.row_marker IS DISTINCT FROM {marker}
+    """
+
+
+def _prediction_rows(table_name: str, model_version: str, chunk: pd.DataFrame, result: pd.DataFrame):
+    prob_columns = [c for c in result.columns if c.startswith('prob_')]
+    confidence = result['confidence'] if 'confidence' in result.columns else None
+    probabilities = result[prob_columns].to_numpy(dtype=np.float64) if prob_columns else None
+    classes = [c[len('prob_'):] for c in prob_columns]
+
+    rows = {}
+    for i, (row_key, row_marker) in enumerate(zip(chunk['_row_key'], chunk['_row_marker'])):
+        # Rows sharing a natural key keep the last one, one statement cannot upsert a key twice
+        rows[row_key] = {
+            'table_name': table_name,
+            'model_version': model_version,
+            'row_key': row_key,
+            'row_marker': row_marker,
+            'predicted_class': str(result['predicted_class'].iat[i]),
+            'confidence': None if confidence is None else float(confidence.iat[i]),
+            'probabilities': None if probabilities is None else dict(zip(classes, probabilities[i].tolist())),
+        }
+    return list(rows.values())
+
+
+def refresh_predictions(table_name: str, chunk_rows: int = MATERIALIZE_CHUNK_ROWS,
+                        progress: Optional[Callable[[int, int], None]] = None) -> Union[Dict[str, Any], str]:
+    """Score the rows of a stored table that are new, changed or scored by an older model.
+
+    The table is read through a server-side cursor chunk by chunk and each
+    chunk's predictions are upserted in their own transaction, so an
+    interrupted refresh resumes where it stopped. Predictions of older model
+    versions and of rows no longer in the table are deleted at the end.
+    Returns a summary, or the wrapper's error message.
+    """
+    if table_name not in ALLOWED_TABLES:
+        raise ValueError(f"Invalid table name: {table_name}")
+
+    start = time.perf_counter()
+    loaded = model_registry.get(table_name)
+    params = {'table_name': table_name, 'model_version': loaded.version}
+    stale_sql = _stale_rows_sql(table_name)
+    ensure_predictions_table()
+
+    with engine.connect() as conn:
+        total_rows = conn.execute(text(f"SELECT COUNT(*) FROM ({stale_sql}) stale"), params).scalar()
+    if progress:
+        progress(0, total_rows)
+
+    rows_scored = 0
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_rows) as conn:
+        for chunk in pd.read_sql(text(stale_sql), conn, params=params, chunksize=chunk_rows):
+            if chunk.empty:
+                continue  # nothing stale
+            features = chunk.drop(columns=['_row_key', '_row_marker'])
+            result = loaded.predict(features)
+            if isinstance(result, str):  # Error message
+                return f"{table_name}: {result}"
+
+            rows = _prediction_rows(table_name, loaded.version, chunk, result)
+            upsert = insert(predictions_table)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=['table_name', 'model_version', 'row_key'],
+                set_={
+                    'row_marker': upsert.excluded.row_marker,
+                    'predicted_class': upsert.excluded.predicted_class,
+                    'confidence': upsert.excluded.confidence,
+                    'probabilities': upsert.excluded.probabilities,
+                    'scored_at': func.now(),
+                },
+            )
+            with engine.begin() as write_conn:
+                write_conn.execute(upsert, rows)
+
+            rows_scored += len(chunk)
+            if progress:
+                progress(rows_scored, total_rows)
+
+    with engine.begin() as conn:
+        stale_versions = conn.execute(text(
+            f"DELETE FROM {PREDICTIONS_TABLE} WHERE table_name = :table_name AND model_version <> :model_version"
+        ), params).rowcount
+        removed_rows = conn.execute(text(f"""
+            DELETE FROM {PREDICTIONS_TABLE} p
+            WHERE p.table_name = :table_name AND NOT EXISTS (
+                SELECT 1 FROM {table_name} t WHERE {row_key_sql(table_name)} = p.row_key
+            )
+        """), {'table_name': table_name}).rowcount
+
+    return {
+        'table': table_name,
+        'model_version': loaded.version,
+        'rows_scored': rows_scored,
+        'deleted_old_versions': stale_versions,
+        'deleted_missing_rows': removed_rows,
+        'execution': execution_engine.settings(table_name),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+if __name__ == '__main__':
+    # python -m inference.materialize [table ...], e.g. from a cron job
+    for name in sys.argv[1:] or ALLOWED_TABLES:
+        print(refresh_predictions(name, progress=lambda done, total: print(f"{name}: {done}/{total}")))
@@ -0,0 +1,65 @@
+import argparse
+import importlib
+import os
+import pickle
+import shutil
+import time
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .registry import WRAPPER_MODULES, model_registry
+
+
+def store_outlier_stats(model_type: str, training: pd.DataFrame,
+                        release: Optional[str] = None) -> Tuple[str, dict]:
+    """Fit a model's outlier fences on its training data and serve them as a new release.
+
+    The active release's files are copied to models/<model_type>/<release>/
+    with the fences in the outlier_stats entry of the preprocessing pickle,
+    the first of the wrapper's MODEL_FILES; the serving release is never
+    modified. The new release is then activated, which loads and warms it
+    up before rewriting the ACTIVE file, and running workers swap it in.
+    """
+    wrapper = importlib.import_module(WRAPPER_MODULES[model_type])
+    if not hasattr(wrapper, 'fit_outlier_stats'):
+        raise ValueError(f"{model_type} does not fit outlier fences at inference time")
+
+    _, source_dir = model_registry.active_release(model_type)
+    release = release or f"outliers-{time.strftime('%Y%m%d-%H%M%S')}"
+    if release in model_registry.releases(model_type):
+        raise ValueError(f'Release "{release}" of {model_type} already exists')
+    release_dir = model_registry._release_dir(model_type, release)
+
+    with open(os.path.join(source_dir, wrapper.MODEL_FILES[0]), 'rb') as f:
+        objs = pickle.load(f)
+    objs['outlier_stats'] = wrapper.fit_outlier_stats(training, objs)
+
+    # Built under a hidden name, so the release is listed only once it is complete
+    tmp_dir = os.path.join(os.path.dirname(release_dir), f".{release}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        for filename in wrapper.MODEL_FILES[1:]:
+            shutil.copy2(os.path.join(source_dir, filename), os.path.join(tmp_dir, filename))
+        with open(os.path.join(tmp_dir, wrapper.MODEL_FILES[0]), 'wb') as f:
+            pickle.dump(objs, f)
+        os.rename(tmp_dir, release_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    model_registry.activate(model_type, release)
+    return release, objs['outlier_stats']
+
+
+if __name__ == '__main__':
+    # python -m inference.outlier_stats toi --csv training.csv [--release name]
+    parser = argparse.ArgumentParser(description="Store a model's training-time outlier fences as a new release.")
+    parser.add_argument('model_type', choices=list(WRAPPER_MODULES))
+    parser.add_argument('--csv', required=True, help='training data the model was fit on')
+    parser.add_argument('--release', help='name of the new release; defaults to outliers-<date>-<time>')
+    args = parser.parse_args()
+
+    training = pd.read_csv(args.csv)
+    release, stats = store_outlier_stats(args.model_type, training, args.release)
+    print(f"{args.model_type}: release {release} with fences for {len(stats)} columns from {len(training)} rows")
@@ -0,0 +1,35 @@
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def class_labels(codes: np.ndarray, classes: Sequence) -> pd.Categorical:
+    """Predicted class codes as labels, what LabelEncoder.inverse_transform returns, stored as codes"""
+    return pd.Categorical.from_codes(np.asarray(codes).astype(np.int64), categories=pd.Index(classes))
+
+
+def prediction_frame(df: pd.DataFrame, labels, proba: Optional[np.ndarray] = None,
+                     classes: Optional[Sequence] = None, decided_by: Optional[pd.Categorical] = None) -> pd.DataFrame:
+    """The input with predicted_class, confidence, prob_* (and decided_by) columns appended.
+
+    The input's columns are referenced, not copied: the prediction columns
+    are built as their own block (categorical labels, float32
+    probabilities) and joined to the input without consolidation. The
+    result shares memory with `df`, so neither may be modified in place.
+    """
+    columns = {"predicted_class": labels if isinstance(labels, pd.Categorical) else pd.Categorical(labels)}
+    if proba is not None:
+        proba = np.asarray(proba, dtype=np.float32)
+        columns["confidence"] = proba.max(axis=1)
+        for i, class_name in enumerate(classes):
+            columns[f"prob_{class_name}"] = proba[:, i]
+    if decided_by is not None:
+        columns["decided_by"] = decided_by
+    block = pd.DataFrame(columns, index=df.index)
+
+    # An upload that already carries prediction columns (a re-uploaded result) has them replaced
+    replaced = df.columns.intersection(block.columns)
+    if len(replaced):
+        df = df.drop(columns=replaced)
+    return pd.concat([df, block], axis=1, copy=False)
@@ -0,0 +1,182 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+# Frames up to this many rows are gathered in one block instead of column by column
+SMALL_FRAME_ROWS = 64
+
+
+class CompiledTransform:
+    """A wrapper's preprocessing pipeline flattened into arrays.
+
+    Column mapping, clip bounds, impute fill values and scale factors are
+    resolved once at load time and then applied to a float64 matrix in a
+    single vectorized pass, instead of column-by-column pandas work.
+    """
+
+    ARRAYS = ('lower', 'upper', 'fill', 'center', 'scale', 'output')
+
+    def __init__(self, columns: List[str], lower=None, upper=None, fill=None,
+                 center=None, scale=None, output=None, coerce: bool = False):
+        self.columns = list(columns)
+        self.coerce = coerce  # pd.to_numeric(errors='coerce') on non-numeric columns
+        n = len(self.columns)
+        self.lower = np.full(n, -np.inf) if lower is None else np.asarray(lower, dtype=np.float64)
+        self.upper = np.full(n, np.inf) if upper is None else np.asarray(upper, dtype=np.float64)
+        # NaN fill value means "not imputed", the column keeps its missing values
+        self.fill = np.full(n, np.nan) if fill is None else np.asarray(fill, dtype=np.float64)
+        self.center = None if center is None else np.asarray(center, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.output = None if output is None else np.asarray(output, dtype=np.intp)
+        self._impute_idx = np.flatnonzero(~np.isnan(self.fill))
+        self._column_set = frozenset(self.columns)
+
+    def share(self, shared, prefix: str = 'transform'):
+        """Swap the arrays for read-only memory maps from a SharedArrayStore"""
+        for name in self.ARRAYS:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, shared.share(f"{prefix}_{name}", value))
+        self._impute_idx = np.flatnonzero(~np.isnan(self.fill))
+        return self
+
+    def overlap(self, df) -> List[str]:
+        return [c for c in df.columns if c in self._column_set]
+
+    def gather(self, df, exclude=()) -> np.ndarray:
+        """Float64 matrix in self.columns order, NaN for columns the input lacks.
+
+        The matrix is column-major so that each column is one contiguous copy
+        and the per-column clip/impute/scale broadcasts stay cache friendly.
+        """
+        X = np.empty((len(df), len(self.columns)), order='F')
+        if not df.columns.is_unique:
+            df = df.loc[:, ~df.columns.duplicated()]
+        positions = df.columns.get_indexer(self.columns)
+
+        if len(df) <= SMALL_FRAME_ROWS:
+            # Per-column indexing costs more than the copy itself for a few rows
+            # (a /predict/manual row), so take all the columns in one block
+            present = np.array([pos >= 0 and c not in exclude for pos, c in zip(positions, self.columns)], dtype=bool)
+            block = df.iloc[:, positions[present]]
+            if self.coerce:
+                block = block.apply(lambda col: col if pd.api.types.is_numeric_dtype(col.dtype)
+                                    else pd.to_numeric(col, errors='coerce'))
+            X[:, ~present] = np.nan
+            X[:, present] = block.to_numpy(dtype=np.float64, na_value=np.nan)
+            return X
+
+        for j, pos in enumerate(positions):
+            if pos < 0 or self.columns[j] in exclude:
+                X[:, j] = np.nan
+                continue
+            col = df.iloc[:, pos]
+            if self.coerce and not pd.api.types.is_numeric_dtype(col.dtype):
+                col = pd.to_numeric(col, errors='coerce')
+            X[:, j] = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        return X
+
+    def clip(self, X: np.ndarray, lower=None, upper=None) -> np.ndarray:
+        lower = self.lower if lower is None else lower
+        upper = self.upper if upper is None else upper
+        return np.clip(X, lower, upper, out=X)  # NaN passes through, as with Series.clip
+
+    def impute(self, X: np.ndarray) -> np.ndarray:
+        _check_finite(X)
+        if len(self._impute_idx):
+            # Columns without a fill value have NaN there, so they stay missing
+            np.copyto(X, self.fill, where=np.isnan(X))
+        return X
+
+    def scale_features(self, X: np.ndarray) -> np.ndarray:
+        if self.center is not None:
+            X -= self.center
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def select(self, X: np.ndarray) -> np.ndarray:
+        """Output columns as a C-contiguous array, the layout the models expect"""
+        return np.ascontiguousarray(X if self.output is None else X[:, self.output])
+
+    def transform(self, df) -> np.ndarray:
+        X = self.gather(df)
+        self.clip(X)
+        self.impute(X)
+        self.scale_features(X)
+        return self.select(X)
+
+
+def _check_finite(X: np.ndarray):
+    # sklearn's imputer/scaler reject infinities (force_all_finite='allow-nan')
+    if np.isinf(X).any():
+        raise ValueError("Input X contains infinity or a value too large for dtype('float64').")
+
+
+def imputer_fill_values(imputer, columns: List[str]) -> np.ndarray:
+    """SimpleImputer statistics aligned to `columns`, NaN where a column is not imputed"""
+    if not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+        raise ValueError("Only imputers with missing_values=np.nan can be compiled")
+    statistics = np.asarray(imputer.statistics_, dtype=np.float64)
+    if np.isnan(statistics).any():
+        raise ValueError("Imputer has all-missing features that sklearn would drop; cannot compile")
+
+    by_name = dict(zip(_feature_names_in(imputer, len(statistics)), statistics))
+    return np.array([by_name.get(c, np.nan) for c in columns], dtype=np.float64)
+
+
+def scaler_arrays(scaler, columns: List[str]):
+    """(center, scale) of a fitted RobustScaler/StandardScaler aligned to `columns`"""
+    names = _feature_names_in(scaler, scaler.n_features_in_)
+    if hasattr(scaler, 'center_'):
+        center = scaler.center_  # None unless with_centering
+    else:
+        center = scaler.mean_ if getattr(scaler, 'with_mean', True) else None
+    scale = getattr(scaler, 'scale_', None)
+
+    index = [names.index(c) for c in columns]
+    center = None if center is None else np.asarray(center, dtype=np.float64)[index]
+    scale = None if scale is None else np.asarray(scale, dtype=np.float64)[index]
+    return center, scale
+
+
+def outlier_bounds(outlier_stats: dict, columns: List[str]):
+    """k2-style {'col': {'lower': .., 'upper': ..}} as lower/upper arrays"""
+    lower = np.full(len(columns), -np.inf)
+    upper = np.full(len(columns), np.inf)
+    for j, col in enumerate(columns):
+        stats = outlier_stats.get(col)
+        if stats is None:
+            continue
+        lo, hi = stats['lower'], stats['upper']
+        if not np.isnan(lo) and not np.isnan(hi):
+            lo, hi = min(lo, hi), max(lo, hi)  # Series.clip swaps reversed bounds
+        lower[j] = -np.inf if np.isnan(lo) else lo
+        upper[j] = np.inf if np.isnan(hi) else hi
+    return lower, upper
+
+
+def quantile_bounds(X: np.ndarray, columns: Optional[np.ndarray] = None, q=(0.01, 0.99), k: float = 3.0):
+    """Batch quantile fences Q1 - k*IQR / Q3 + k*IQR, matching Series.quantile"""
+    lower = np.full(X.shape[1], -np.inf)
+    upper = np.full(X.shape[1], np.inf)
+    idx = np.arange(X.shape[1]) if columns is None else np.asarray(columns, dtype=np.intp)
+    if len(X) == 0 or len(idx) == 0:
+        return lower, upper
+
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        q1, q3 = np.nanpercentile(X[:, idx], np.asarray(q) * 100.0, axis=0)
+        iqr = q3 - q1
+        lo, hi = q1 - k * iqr, q3 + k * iqr
+    # Series.clip ignores a NaN threshold
+    lower[idx] = np.where(np.isnan(lo), -np.inf, lo)
+    upper[idx] = np.where(np.isnan(hi), np.inf, hi)
+    return lower, upper
+
+
+def _feature_names_in(estimator, n: int) -> List[str]:
+    names = getattr(estimator, 'feature_names_in_', None)
+    return list(names) if names is not None else list(range(n))
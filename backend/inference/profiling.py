@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Stage timings of the current recording, or None when nothing is recording
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage (preprocess, impute, scale, predict, output).
+
+    Costs one context variable lookup unless record_stages() is active, so
+    the wrappers can mark their stages unconditionally. Time spent in a
+    stage entered more than once is summed.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def record_stages() -> Iterator[Dict[str, float]]:
+    """Collect the seconds spent in each stage entered inside the block, in this thread"""
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
@@ -0,0 +1,358 @@
+import hashlib
+import importlib
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cascade import cascade_key
+from .execution import execution_engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.getenv('MODELS_DIR', os.path.join(BACKEND_DIR, 'models'))
+# Memory-mapped artifacts live outside the repo so every worker on the host shares them
+ARTIFACT_DIR = os.getenv('MODEL_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'exoplanet_model_artifacts'))
+
+# Name of the file in models/<model_type>/ holding the release (subdirectory) to serve
+ACTIVE_FILE = 'ACTIVE'
+# Seconds between checks for a new active release or replaced model files; 0 disables the watcher
+WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_SECONDS', 5))
+# Load and warm up every model type when the watcher starts instead of on first use
+PRELOAD = os.getenv('MODEL_PRELOAD', 'false').lower() == 'true'
+# Synthetic batch sizes run through a freshly loaded model before it serves requests
+WARMUP_ROWS = [1, 256]
+
+# Model type -> wrapper module providing MODEL_FILES, load() and predict()
+WRAPPER_MODULES = {
+    'k2': 'k2_wrapper',
+    'toi': 'toi_wrapper',
+    'kepler': 'kepler_wrapper',
+}
+
+
+class SharedArrayStore:
+    """Write-once .npy files that are opened as read-only memory maps.
+
+    All worker processes map the same file, so the OS page cache holds one
+    copy of each array instead of one per worker.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def share(self, name: str, array) -> np.ndarray:
+        array = np.asarray(array)
+        if array.dtype.kind not in 'biuf':
+            return array  # object/string arrays cannot be memory-mapped
+
+        path = os.path.join(self.root, f"{name}.npy")
+        if os.path.exists(path):
+            shared = np.load(path, mmap_mode='r')
+            # The directory is keyed by the model files only; a wrapper that now
+            # derives a different array from them must not get the old one
+            if shared.dtype == array.dtype and np.array_equal(shared, array, equal_nan=array.dtype.kind == 'f'):
+                return shared
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)  # atomic, concurrent writers produce identical files
+        return np.load(path, mmap_mode='r')
+
+
+class LoadedModel:
+    """Artifacts of one model type, as returned by its wrapper's load()"""
+
+    def __init__(self, model_type: str, version: str, wrapper, artifacts: Dict[str, Any], load_seconds: float,
+                 release: Optional[str] = None):
+        self.model_type = model_type
+        self.version = version
+        self.release = release
+        self.wrapper = wrapper
+        self.artifacts = artifacts
+        self.load_seconds = load_seconds
+        self.warmup_seconds = 0.0
+        self.loaded_at = time.time()
+
+    def predict(self, df, share: int = 1):
+        """Wrapper prediction, run by the execution engine within the core budget (or `share` of it)"""
+        return execution_engine.predict(self, df, share)
+
+    @property
+    def row_independent(self) -> bool:
+        """Whether each output row depends only on its own input row, so rows can be batched together"""
+        return self.artifacts.get('row_independent', getattr(self.wrapper, 'ROW_INDEPENDENT', False))
+
+    @property
+    def read_columns(self) -> List[str]:
+        """Upload columns the wrapper reads; any other column only passes through to its output"""
+        return self.artifacts.get('read_columns', self.artifacts['input_features'])
+
+    def warm_up(self):
+        """Run synthetic rows through preprocessing and the model before serving requests.
+
+        The first calls of a freshly loaded model pay for lazy initialization
+        (native thread pools, memory-mapped pages, code paths of both the
+        small-batch and the batch evaluator); the warm-up takes that off the
+        first user request. A wrapper error fails the load.
+        """
+        from .synthetic import synthetic_frame
+
+        start = time.perf_counter()
+        for rows in WARMUP_ROWS:
+            result = self.predict(synthetic_frame(self, rows, nan_fraction=0.1))
+            if isinstance(result, str):  # Error message
+                raise RuntimeError(f"{self.model_type} warm-up failed: {result}")
+        self.warmup_seconds = time.perf_counter() - start
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'model_type': self.model_type,
+            'version': self.version,
+            'release': self.release,
+            'load_seconds': round(self.load_seconds, 4),
+            'warmup_seconds': round(self.warmup_seconds, 4),
+            'loaded_at': self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """Loads each model type on first use and swaps in new versions without a restart.
+
+    A model type's files are read from models/<model_type>/<release>/, the
+    release named in models/<model_type>/ACTIVE, or from models/ itself
+    while a type has no ACTIVE file. A new version (another release made
+    active, or a model file replaced in place) is loaded and warmed up
+    next to the serving one, then swapped in with a single assignment.
+    Requests hold the LoadedModel they started with, so an old version
+    stays in memory until the last of them finishes. activate() switches
+    this process; the watcher picks up the change in every other worker.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, artifact_dir: str = ARTIFACT_DIR,
+                 watch_interval: float = WATCH_INTERVAL):
+        self.models_dir = models_dir
+        self.artifact_dir = artifact_dir
+        self.watch_interval = watch_interval
+        self._models: Dict[str, LoadedModel] = {}
+        self._locks = {model_type: threading.Lock() for model_type in WRAPPER_MODULES}
+        self._signatures: Dict[str, Tuple] = {}
+        self._file_versions: Dict[str, Tuple[Tuple, str]] = {}  # model type -> (signature, version) of unloaded files
+        self._errors: Dict[str, str] = {}
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    @property
+    def model_types(self) -> List[str]:
+        return list(WRAPPER_MODULES)
+
+    def get(self, model_type: str) -> LoadedModel:
+        loaded = self._models.get(model_type)
+        if loaded is not None:
+            return loaded
+
+        if model_type not in WRAPPER_MODULES:
+            raise ValueError(f'Model type "{model_type}" not supported')
+
+        with self._locks[model_type]:
+            loaded = self._models.get(model_type)
+            if loaded is None:
+                # Taken before loading, so files replaced meanwhile are picked up by the watcher
+                self._signatures[model_type] = self._signature(model_type)
+                loaded = self._load(model_type, *self.active_release(model_type))
+                self._models[model_type] = loaded
+        return loaded
+
+    def get_if_loaded(self, model_type: str) -> Optional[LoadedModel]:
+        """The serving version of a model type, None instead of loading it"""
+        return self._models.get(model_type)
+
+    def required_features(self, model_type: str) -> List[str]:
+        """Features every row of a manual or JSON batch request needs, without loading the model"""
+        if model_type not in WRAPPER_MODULES:
+            raise ValueError(f'Model type "{model_type}" not supported')
+        return list(importlib.import_module(WRAPPER_MODULES[model_type]).REQUIRED_FEATURES)
+
+    def loaded(self) -> List[Dict[str, Any]]:
+        return [loaded.info() for loaded in list(self._models.values())]
+
+    def version(self, model_type: str) -> str:
+        """Version of a model type, without loading it if it is not loaded yet.
+
+        The files of a model that is not loaded are hashed again only when
+        their signature (active release, sizes and mtimes) changes.
+        """
+        loaded = self._models.get(model_type)
+        if loaded is not None:
+            return loaded.version
+        if model_type not in WRAPPER_MODULES:
+            raise ValueError(f'Model type "{model_type}" not supported')
+        signature = self._signature(model_type)
+        cached = self._file_versions.get(model_type)
+        if cached is None or cached[0] != signature:
+            _, model_dir = self.active_release(model_type)
+            cached = self._file_versions[model_type] = (signature, self._version(model_type, model_dir))
+        return cached[1]
+
+    def active_release(self, model_type: str) -> Tuple[Optional[str], str]:
+        """Release a model type is served from and its directory; (None, models_dir) without releases"""
+        try:
+            with open(os.path.join(self.models_dir, model_type, ACTIVE_FILE)) as f:
+                release = f.read().strip()
+        except FileNotFoundError:
+            return None, self.models_dir
+        return release, self._release_dir(model_type, release)
+
+    def releases(self, model_type: str) -> List[str]:
+        type_dir = os.path.join(self.models_dir, model_type)
+        if not os.path.isdir(type_dir):
+            return []
+        return sorted(entry.name for entry in os.scandir(type_dir)
+                      if entry.is_dir() and not entry.name.startswith('.'))
+
+    def status(self) -> Dict[str, Any]:
+        """Serving version, active and available releases, and last reload error of every model type"""
+        models = {}
+        for model_type in self.model_types:
+            loaded = self._models.get(model_type)
+            models[model_type] = {
+                'active_release': self.active_release(model_type)[0],
+                'releases': self.releases(model_type),
+                'serving': loaded.info() if loaded is not None else None,
+                'error': self._errors.get(model_type),
+            }
+        return models
+
+    def activate(self, model_type: str, release: str) -> LoadedModel:
+        """Load and warm up a release, make it the active one and serve it from now on.
+
+        The ACTIVE file is only rewritten once the release has loaded and
+        warmed up, so a broken release never becomes active anywhere.
+        """
+        if model_type not in WRAPPER_MODULES:
+            raise ValueError(f'Model type "{model_type}" not supported')
+        if release not in self.releases(model_type):
+            raise ValueError(f'Release "{release}" of {model_type} not found')
+
+        with self._locks[model_type]:
+            loaded = self._models.get(model_type)
+            model_dir = self._release_dir(model_type, release)
+            if loaded is None or loaded.release != release or loaded.version != self._version(model_type, model_dir):
+                loaded = self._load(model_type, release, model_dir)
+                loaded.warm_up()
+
+            path = os.path.join(self.models_dir, model_type, ACTIVE_FILE)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(f"{release}\n")
+            os.replace(tmp_path, path)
+
+            self._models[model_type] = loaded
+            self._signatures[model_type] = self._signature(model_type)
+            self._errors.pop(model_type, None)
+        print(f"{model_type}: serving release {release} (version {loaded.version})")
+        return loaded
+
+    def reload(self, model_type: str) -> LoadedModel:
+        """Swap in the active release's files if they differ from the serving version"""
+        with self._locks[model_type]:
+            self._signatures[model_type] = self._signature(model_type)
+            release, model_dir = self.active_release(model_type)
+            loaded = self._models.get(model_type)
+            if loaded is not None and loaded.version == self._version(model_type, model_dir):
+                return loaded
+
+            try:
+                new = self._load(model_type, release, model_dir)
+                new.warm_up()
+            except Exception as e:
+                self._errors[model_type] = str(e)
+                raise
+            self._models[model_type] = new
+            self._errors.pop(model_type, None)
+        print(f"{model_type}: serving version {new.version}" + (f" (release {release})" if release else ""))
+        return new
+
+    def start_watcher(self, preload: bool = PRELOAD):
+        """Poll for new active releases and replaced model files of the model types this process has loaded.
+
+        Model types load on first use; with preload (MODEL_PRELOAD=true)
+        the watcher thread first loads and warms up every one of them.
+        """
+        if self.watch_interval <= 0 and not preload:
+            return
+        if self._watcher is None:
+            with self._watcher_lock:
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self._watch_loop, args=(preload,),
+                                                     name='model-watcher', daemon=True)
+                    self._watcher.start()
+
+    def _watch_loop(self, preload: bool):
+        if preload:
+            for model_type in self.model_types:
+                try:
+                    self.reload(model_type)
+                except Exception as e:
+                    print(f"Preloading {model_type} failed: {e}")
+        while self.watch_interval > 0:
+            time.sleep(self.watch_interval)
+            for model_type in list(self._models):
+                try:
+                    if self._signature(model_type) != self._signatures.get(model_type):
+                        self.reload(model_type)
+                except Exception as e:
+                    # The serving version keeps serving until the files are fixed
+                    print(f"Reloading {model_type} failed: {e}")
+
+    def _signature(self, model_type: str) -> Tuple:
+        """Cheap stand-in for the version: the active release and its files' sizes and mtimes"""
+        release, model_dir = self.active_release(model_type)
+        stats = []
+        for filename in importlib.import_module(WRAPPER_MODULES[model_type]).MODEL_FILES:
+            try:
+                st = os.stat(os.path.join(model_dir, filename))
+                stats.append((filename, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                stats.append((filename, None, None))
+        return (release, tuple(stats))
+
+    def _release_dir(self, model_type: str, release: str) -> str:
+        if not release or release != os.path.basename(release) or release.startswith('.'):
+            raise ValueError(f'Invalid release name for {model_type}: "{release}"')
+        return os.path.join(self.models_dir, model_type, release)
+
+    def _load(self, model_type: str, release: Optional[str], model_dir: str) -> LoadedModel:
+        wrapper = importlib.import_module(WRAPPER_MODULES[model_type])
+        version = self._version(model_type, model_dir)
+        shared = SharedArrayStore(os.path.join(self.artifact_dir, model_type, version))
+
+        start = time.perf_counter()
+        artifacts = wrapper.load(model_dir, shared)
+        return LoadedModel(model_type, version, wrapper, artifacts, time.perf_counter() - start, release)
+
+    def _version(self, model_type: str, model_dir: str) -> str:
+        """Content hash of the model files, so a replaced file never reuses stale artifacts.
+
+        Settings that change the predictions (the cascade) are hashed too, so
+        results stored under other settings are not served.
+        """
+        digest = hashlib.sha256()
+        digest.update(cascade_key(model_type).encode())
+        for filename in importlib.import_module(WRAPPER_MODULES[model_type]).MODEL_FILES:
+            path = os.path.join(model_dir, filename)
+            if not os.path.exists(path):
+                continue  # the wrapper's load() reports the missing file
+            digest.update(filename.encode())
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        return digest.hexdigest()[:12]
+
+
+# Global registry instance shared by the routes and the wrappers
+model_registry = ModelRegistry()
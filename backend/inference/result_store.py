@@ -0,0 +1,203 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Seconds a result stays downloadable after it was last produced or served
+RESULT_TTL = int(os.getenv('RESULT_TTL_SECONDS', 300))
+# Total size of stored results; least recently used ones are evicted above it
+RESULT_QUOTA_BYTES = int(os.getenv('RESULT_QUOTA_MB', 2048)) * 1024 * 1024
+# Seconds between janitor sweeps
+SWEEP_INTERVAL = int(os.getenv('RESULT_SWEEP_SECONDS', 30))
+# Result formats worth gzip-compressing for download (parquet/feather are compressed already)
+GZIP_FORMATS = ('csv',)
+META_SUFFIX = '.json'
+GZIP_SUFFIX = '.gz'
+
+
+class ResultStore:
+    """Prediction results stored under the hash of the upload that produced them.
+
+    A result is addressed by (upload sha256, model type, model version), so an
+    identical upload is answered without parsing or inference, and different
+    files that happen to share a name never overwrite each other.
+
+    Each result file has a JSON sidecar with the response summary. The
+    sidecars are the store's index: they live next to the results, so they
+    survive restarts and are shared by every worker process. One janitor
+    thread per process sweeps the folder, deleting results unused for the
+    TTL and then the least recently used ones while the total size is over
+    the quota. Files without a sidecar are never touched.
+    """
+
+    def __init__(self, folder: str, ttl: int = RESULT_TTL, quota_bytes: int = RESULT_QUOTA_BYTES,
+                 sweep_interval: int = SWEEP_INTERVAL):
+        self.folder = folder
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        self._janitor = None
+        self._janitor_lock = threading.Lock()
+        self._evicted = 0
+
+    def name_for(self, file_hash: str, model_type: str, model_version: str, extension: str = 'csv',
+                 all_columns: bool = False) -> str:
+        """Result file name; a result carrying every upload column is stored apart from one with the model's"""
+        suffix = '_all' if all_columns else ''
+        return f"predictions_{model_type}_{file_hash[:32]}_{model_version}{suffix}.{extension}"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Summary of a stored result, refreshing its expiry, or None"""
+        self.start_janitor()
+        try:
+            with open(self._meta_path(name)) as f:
+                meta = json.load(f)
+            self.touch(name)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return meta
+
+    def put(self, name: str, meta: Dict[str, Any]):
+        """Record the summary of a result file already written to path(name)"""
+        self.start_janitor()
+        meta = {**meta, 'result_file': name, 'created_at': time.time()}
+        tmp_path = f"{self._meta_path(name)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(name))
+
+    def is_result(self, name: str) -> bool:
+        return os.path.exists(self._meta_path(name)) and os.path.exists(self.path(name))
+
+    def touch(self, name: str):
+        """Mark a result as used; its sidecar's mtime is the last access the janitor goes by.
+
+        The result file itself is left alone: its mtime is the Last-Modified
+        and ETag downloads are served with, which must not change between the
+        requests of a resumed download.
+        """
+        os.utime(self._meta_path(name))
+
+    def compressed(self, name: str) -> Optional[str]:
+        """Path of a gzip copy of a stored result, created on first use.
+
+        None for files the store does not manage or formats that do not
+        compress. The copy is deleted together with the result.
+        """
+        if name.rsplit('.', 1)[-1] not in GZIP_FORMATS or not self.is_result(name):
+            return None
+        path = self.path(name)
+        gz_path = f"{path}{GZIP_SUFFIX}"
+        if not os.path.exists(gz_path):  # results never change under the same name
+            tmp_path = f"{gz_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, gz_path)
+        return gz_path
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Live results in the folder with their size and last access time"""
+        entries = []
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return entries
+        for meta_name in names:
+            if not meta_name.endswith(META_SUFFIX):
+                continue
+            name = meta_name[:-len(META_SUFFIX)]
+            try:
+                size = os.path.getsize(self.path(name))
+                last_access = os.path.getmtime(self._meta_path(name))
+            except FileNotFoundError:
+                continue
+            gz_path = f"{self.path(name)}{GZIP_SUFFIX}"
+            if os.path.exists(gz_path):
+                size += os.path.getsize(gz_path)
+            entries.append({'name': name, 'size': size, 'last_access': last_access})
+        return entries
+
+    def sweep(self) -> int:
+        """Delete expired results, then least recently used ones over the quota"""
+        now = time.time()
+        removed = 0
+        live = []
+        for entry in self.entries():
+            if now - entry['last_access'] > self.ttl:
+                self._remove(entry['name'])
+                removed += 1
+            else:
+                live.append(entry)
+
+        total = sum(entry['size'] for entry in live)
+        for entry in sorted(live, key=lambda e: e['last_access']):
+            if total <= self.quota_bytes:
+                break
+            self._remove(entry['name'])
+            total -= entry['size']
+            removed += 1
+
+        self._remove_orphans(now)
+        self._evicted += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.entries()
+        return {
+            'results': len(entries),
+            'bytes': sum(entry['size'] for entry in entries),
+            'quota_bytes': self.quota_bytes,
+            'ttl_seconds': self.ttl,
+            'evicted': self._evicted,
+        }
+
+    def start_janitor(self):
+        if self._janitor is None:
+            with self._janitor_lock:
+                if self._janitor is None:
+                    self._janitor = threading.Thread(target=self._janitor_loop, name='result-janitor', daemon=True)
+                    self._janitor.start()
+
+    def _janitor_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Result store sweep failed: {e}")
+            time.sleep(self.sweep_interval)
+
+    def _remove(self, name: str):
+        path = self.path(name)
+        for victim in (path, f"{path}{GZIP_SUFFIX}", self._meta_path(name)):
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass  # another worker's janitor got there first
+
+    def _remove_orphans(self, now: float):
+        """Sidecars whose result is gone, and temp files left by a crashed writer"""
+        for entry in os.scandir(self.folder):
+            name = entry.name
+            if not name.startswith('predictions_'):
+                continue
+            try:
+                if name.endswith(META_SUFFIX):
+                    if not os.path.exists(self.path(name[:-len(META_SUFFIX)])):
+                        os.remove(entry.path)
+                elif name.endswith(('.tmp', '.part')) and now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _meta_path(self, name: str) -> str:
+        return f"{self.path(name)}{META_SUFFIX}"
+
+
+# Global result store, in the folder served by /api/download
+result_store = ResultStore(os.getenv('RESULTS_FOLDER', 'uploads'))
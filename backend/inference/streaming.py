@@ -0,0 +1,44 @@
+import os
+from typing import Any, Callable, Collection, Dict, Optional, Union
+
+from .formats import ResultWriter, read_chunks
+from .summary import PredictionSummary
+
+# Rows parsed, predicted and written per step; bounds peak memory for large uploads
+CHUNK_ROWS = int(os.getenv('PREDICT_CHUNK_ROWS', 50000))
+
+
+def predict_stream(loaded, source, file_ext: str, result_path: str, result_format: str = 'csv',
+                   chunk_rows: int = CHUNK_ROWS,
+                   progress: Optional[Callable[[int], None]] = None,
+                   usecols: Optional[Collection[str]] = None,
+                   float_columns: Collection[str] = ()) -> Union[Dict[str, Any], str]:
+    """Predict an upload chunk by chunk, appending each chunk's output to result_path.
+
+    Returns a summary dict, or the wrapper's error message if a chunk fails.
+    Memory use depends on chunk_rows, not on the size of the upload. Without stored
+    outlier_stats the TOI wrapper derives its clipping fences from the batch
+    it is given, so with that model each chunk is clipped against its own
+    quantiles. usecols and float_columns are passed on to read_chunks.
+    """
+    partial_path = f"{result_path}.part"
+    summary = PredictionSummary()
+
+    try:
+        with ResultWriter(partial_path, result_format) as out:
+            for chunk in read_chunks(source, file_ext, chunk_rows, usecols, float_columns):
+                result = loaded.predict(chunk)
+                if isinstance(result, str):  # Error message
+                    return result
+
+                out.write(result)
+                summary.update(result)
+                if progress:
+                    progress(summary.rows)
+
+        os.replace(partial_path, result_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    return summary.to_dict()
@@ -0,0 +1,80 @@
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Predictions returned inline with a result, the rest are served from the stored result
+PREVIEW_ROWS = 100
+# Equal-width confidence bins over [0, 1]
+HISTOGRAM_BINS = 10
+# Stored with a result and returned in place of the full prediction list
+SUMMARY_FIELDS = ('rows_processed', 'class_counts', 'mean_confidence', 'confidence_histogram', 'decided_by')
+
+
+class PredictionSummary:
+    """Class counts, confidence statistics and a preview of a wrapper's output.
+
+    Fed one output frame (or streamed chunk) at a time, with vectorized
+    counts per frame, so a summary costs the same memory for any number of
+    rows. `prefix` selects one model's columns of a combined auto result.
+    """
+
+    def __init__(self, prefix: str = ''):
+        self.class_column = f"{prefix}predicted_class"
+        self.confidence_column = f"{prefix}confidence"
+        self.decided_by_column = f"{prefix}decided_by"
+        self.rows = 0
+        self.class_counts: Dict[str, int] = {}
+        self.decided_by: Dict[str, int] = {}
+        self.preview = []
+        self._confidence_sum = 0.0
+        self._confidence_count = 0
+        self._histogram: Optional[np.ndarray] = None
+
+    def update(self, result: pd.DataFrame):
+        self.rows += len(result)
+        classes = result[self.class_column]
+        for label, count in classes.value_counts().items():
+            if not count:
+                continue  # categorical labels count every class, predicted or not
+            self.class_counts[str(label)] = self.class_counts.get(str(label), 0) + int(count)
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview.extend(classes.iloc[:PREVIEW_ROWS - len(self.preview)].tolist())
+
+        if self.decided_by_column in result.columns:  # Rows per cascade stage
+            for stage, count in result[self.decided_by_column].value_counts().items():
+                if not count:
+                    continue
+                self.decided_by[str(stage)] = self.decided_by.get(str(stage), 0) + int(count)
+
+        if self.confidence_column in result.columns:  # Kepler outputs classes only
+            confidence = result[self.confidence_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            confidence = confidence[~np.isnan(confidence)]
+            self._confidence_sum += float(confidence.sum())
+            self._confidence_count += len(confidence)
+            bins = np.minimum((confidence * HISTOGRAM_BINS).astype(np.intp), HISTOGRAM_BINS - 1)
+            counts = np.bincount(np.maximum(bins, 0), minlength=HISTOGRAM_BINS)
+            self._histogram = counts if self._histogram is None else self._histogram + counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = {
+            'rows_processed': self.rows,
+            'class_counts': self.class_counts,
+            'mean_confidence': None,
+            'confidence_histogram': None,
+            'decided_by': self.decided_by or None,
+            'preview': self.preview,
+        }
+        if self._confidence_count:
+            summary['mean_confidence'] = self._confidence_sum / self._confidence_count
+            summary['confidence_histogram'] = {
+                'bin_edges': np.linspace(0, 1, HISTOGRAM_BINS + 1).round(6).tolist(),
+                'counts': self._histogram.tolist(),
+            }
+        return summary
+
+
+def summarize(result: pd.DataFrame, prefix: str = '') -> Dict[str, Any]:
+    summary = PredictionSummary(prefix)
+    summary.update(result)
+    return summary.to_dict()
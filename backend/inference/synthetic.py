@@ -0,0 +1,53 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+def feature_columns(loaded) -> List[str]:
+    """Columns an upload for this model would carry.
+
+    The wrapper's input features, with engineered features (TOI) replaced by
+    the raw columns they are computed from, so benchmarks and the warm-up
+    exercise the feature engineering step too.
+    """
+    columns = list(loaded.artifacts["input_features"])
+    # Not getattr: a wrapper resolves unknown attributes by loading its model, which may be this one
+    engineered = vars(loaded.wrapper).get("ENGINEERED_FEATURES", [])
+    derived = {name for name, _, _ in engineered}
+    columns = [c for c in columns if c not in derived]
+    for name, inputs, _ in engineered:
+        columns.extend(c for c in inputs if c not in columns)
+    return columns
+
+
+def synthetic_frame(loaded, rows: int, nan_fraction: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    """Random upload of `rows` rows for a loaded model.
+
+    Values are drawn around the training distribution where the transform
+    knows it (scaler center and scale, else the imputer fill value), so
+    clipping and the trees see realistic inputs. Each cell is NaN with
+    probability nan_fraction.
+    """
+    rng = np.random.default_rng(seed)
+    transform = loaded.artifacts["transform"]
+    index = {c: j for j, c in enumerate(transform.columns)}
+
+    data = {}
+    for column in feature_columns(loaded):
+        j = index.get(column)
+        loc, spread = 0.0, 1.0
+        if j is not None:
+            if transform.center is not None:
+                loc = transform.center[j]
+            elif not np.isnan(transform.fill[j]):
+                loc = transform.fill[j]
+            if transform.scale is not None:
+                spread = transform.scale[j]
+            else:
+                spread = max(abs(loc) * 0.5, 1.0)
+        values = rng.normal(loc, spread, rows)
+        if nan_fraction > 0:
+            values[rng.random(rows) < nan_fraction] = np.nan
+        data[column] = values
+    return pd.DataFrame(data)
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import shutil
+import uuid
+from tempfile import SpooledTemporaryFile
+
+from flask import Request
+
+COPY_BLOCK_SIZE = 1024 * 1024
+# Uploads up to this size stay in memory; larger ones spill to a temporary file
+SPOOL_MAX_BYTES = int(os.getenv('UPLOAD_SPOOL_MB', 16)) * 1024 * 1024
+
+
+class HashingSpooledFile(SpooledTemporaryFile):
+    """Upload buffer that hashes the bytes as the form parser writes them"""
+
+    def __init__(self, max_size: int = SPOOL_MAX_BYTES):
+        super().__init__(max_size=max_size, mode='w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, s):
+        self._digest.update(s)
+        self.size += len(s)
+        return super().write(s)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class UploadRequest(Request):
+    """Flask request whose file uploads are parsed into HashingSpooledFile buffers.
+
+    Werkzeug's default spills anything over 500KB to disk; with a larger spool
+    a typical upload is parsed straight from memory and never touches disk.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile()
+
+
+def upload_digest(file):
+    """(sha256 hex digest, size in bytes) of an uploaded FileStorage"""
+    stream = file.stream
+    if isinstance(stream, HashingSpooledFile):
+        return stream.hexdigest(), stream.size
+
+    # Parsed by a plain Request: hash it in one extra pass
+    stream.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+def upload_source(file):
+    """The upload's buffer rewound for pd.read_csv/read_excel, without copying it"""
+    file.stream.seek(0)
+    return file.stream
+
+
+def save_upload(file, folder: str, extension: str) -> str:
+    """Write an upload to disk under a unique name, for work that outlives the request"""
+    path = os.path.join(folder, f"upload_{uuid.uuid4().hex}.{extension}")
+    with open(path, 'wb') as out:
+        shutil.copyfileobj(upload_source(file), out, COPY_BLOCK_SIZE)
+    return path
@@ -4,113 +4,160 @@ import pickle
 import xgboost as xgb
 import os
 import warnings
+from inference import model_registry
+from inference.preprocess import CompiledTransform, imputer_fill_values, scaler_arrays, outlier_bounds
+from inference.booster import load_booster, predict_proba, iteration_range, gives_proba
+from inference.flat_trees import compile_flat_trees
+from inference.cascade import compile_cascade, cascade_proba
+from inference.output import class_labels, prediction_frame
+from inference.profiling import stage
 
 warnings.filterwarnings('ignore')
 
-# -------------------------------
-# Paths
-# -------------------------------
-script_dir = os.path.dirname(os.path.abspath(__file__))
+MODEL_TYPE = "k2"
+MODEL_FILES = ["k2_preprocess.pkl", "k2.pkl"]
+# Each output row depends only on its own input row, so rows can be batched together
+ROW_INDEPENDENT = True
+# Fewest recognised input columns an upload needs to be scored by this model
+MIN_OVERLAP = 10
+# Features a manual or JSON batch request must give a value for
+REQUIRED_FEATURES = [
+    'sy_snum', 'sy_pnum', 'disc_year', 'pl_orbper', 'pl_orbpererr1',
+    'pl_rade', 'pl_radeerr1', 'pl_radeerr2', 'ttv_flag', 'st_teff'
+]
+# Predict with the native XGBoost booster (one in-place pass) instead of the sklearn wrapper
+NATIVE_BOOSTER = os.getenv('K2_NATIVE_BOOSTER', 'true').lower() == 'true'
 
 # -------------------------------
-# Load preprocessing objects
+# Load preprocessing objects and trained K2 model
 # -------------------------------
-try:
-    with open(os.path.join(script_dir, "models", "k2_preprocess.pkl"), "rb") as f:
-        preprocess_objs = pickle.load(f)
+def load(models_dir, shared):
+    """
+    Loads the K2 artifacts. Called once per process by the model registry;
+    numeric arrays are swapped for memory maps shared between workers.
+    """
+    try:
+        with open(os.path.join(models_dir, "k2_preprocess.pkl"), "rb") as f:
+            preprocess_objs = pickle.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError("K2_Preprocessing_Model.pkl not found. Please run 'K2_preprocessing_model_creator.py' first")
 
     imputer = preprocess_objs["imputer"]
     scaler = preprocess_objs["scaler"]
-    label_encoder = preprocess_objs["label_encoder"]
     feature_names = preprocess_objs["feature_names"]
-    categorical_encoders = preprocess_objs.get("categorical_encoders", {})
     outlier_stats = preprocess_objs["outlier_stats"]
 
-except FileNotFoundError:
-    raise FileNotFoundError("K2_Preprocessing_Model.pkl not found. Please run 'K2_preprocessing_model_creator.py' first")
-
-# -------------------------------
-# Load trained K2 model
-# -------------------------------
-try:
-    with open(os.path.join(script_dir, "models", "k2.pkl"), "rb") as f:
-        model = pickle.load(f)
-except FileNotFoundError:
-    raise FileNotFoundError("k2.pkl not found. Please run 'Train.py' first to train the model")
+    # Steps 3-7 of the training pipeline compiled into one vectorized transform
+    lower, upper = outlier_bounds(outlier_stats, feature_names)
+    center, scale = scaler_arrays(scaler, feature_names)
+    transform = CompiledTransform(
+        feature_names,
+        lower=lower,
+        upper=upper,
+        fill=imputer_fill_values(imputer, feature_names),
+        center=center,
+        scale=scale,
+        coerce=True,
+    ).share(shared)
+
+    model_artifacts = {}
+    try:
+        booster = load_booster(models_dir, "k2.pkl", shared) if NATIVE_BOOSTER else None
+        # Any objective but multi:softprob goes through the sklearn wrapper's predict_proba
+        if booster is not None and gives_proba(booster):
+            model_artifacts["booster"] = booster
+            # Single rows and small batches (/predict/manual) walk flat arrays instead
+            model_artifacts["flat_trees"] = compile_flat_trees(booster, iteration_range(booster), shared)
+            # Large batches optionally go through the first rounds only, then the whole ensemble for unsure rows
+            model_artifacts["cascade"] = compile_cascade(MODEL_TYPE, booster, iteration_range(booster))
+        else:
+            with open(os.path.join(models_dir, "k2.pkl"), "rb") as f:
+                model_artifacts["model"] = pickle.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError("k2.pkl not found. Please run 'Train.py' first to train the model")
+
+    return {
+        "imputer": imputer,
+        "scaler": scaler,
+        "label_encoder": preprocess_objs["label_encoder"],
+        "feature_names": feature_names,
+        "input_features": list(feature_names),
+        "categorical_encoders": preprocess_objs.get("categorical_encoders", {}),
+        "outlier_stats": outlier_stats,
+        "transform": transform,
+        **model_artifacts,
+    }
+
+def __getattr__(name):
+    """Expose the loaded artifacts (feature_names, booster, ...) as module attributes"""
+    if not name.startswith("__"):
+        artifacts = model_registry.get(MODEL_TYPE).artifacts
+        if name in artifacts:
+            return artifacts[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -------------------------------
 # Preprocessing Function
 # -------------------------------
-def preprocess(df_raw):
+def preprocess(df_raw, loaded=None):
     """
     Preprocesses user input DataFrame following the same pipeline as training
     """
+    loaded = loaded or model_registry.get(MODEL_TYPE)
+    transform = loaded.artifacts["transform"]
 
     # 1. Check column overlap
-    overlap_cols = [c for c in df_raw.columns if c in feature_names]
-    if len(overlap_cols) < 10:
-        return f"Need at least 10 overlapping features, found {len(overlap_cols)}"
+    overlap_cols = transform.overlap(df_raw)
+    if len(overlap_cols) < MIN_OVERLAP:
+        return f"Need at least {MIN_OVERLAP} overlapping features, found {len(overlap_cols)}"
 
-    # 2. Keep only overlapping features
-    df = df_raw[overlap_cols].copy()
+    with stage("preprocess"):
+        # 2-4. Overlapping features as numeric, missing ones as NaN, in feature order
+        X = transform.gather(df_raw)
 
-    # 3. Convert to numeric
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # 4. Handle missing columns
-    missing_cols = [col for col in feature_names if col not in df.columns]
-    for col in missing_cols:
-        df[col] = np.nan
-
-    # Ensure feature order
-    df = df[feature_names]
-
-    # 5. Outlier clipping
-    for col, stats in outlier_stats.items():
-        if col in df.columns:
-            df[col] = df[col].clip(lower=stats['lower'], upper=stats['upper'])
+        # 5. Outlier clipping
+        transform.clip(X)
 
     # 6. Impute missing values
-    df_imputed = pd.DataFrame(
-        imputer.transform(df.values),
-        columns=feature_names,
-        index=df.index
-    )
+    with stage("impute"):
+        transform.impute(X)
 
     # 7. Scale features
-    df_scaled_array = scaler.transform(df_imputed.values)
-
-    return df_scaled_array
+    with stage("scale"):
+        transform.scale_features(X)
+        return transform.select(X)
 
 # -------------------------------
 # Prediction Function
 # -------------------------------
-def predict(df_raw):
+def predict(df_raw, loaded=None):
     """Make predictions using K2 model"""
     try:
-        processed_data = preprocess(df_raw)
+        loaded = loaded or model_registry.get(MODEL_TYPE)
+        label_encoder = loaded.artifacts["label_encoder"]
+
+        processed_data = preprocess(df_raw, loaded)
 
         if isinstance(processed_data, str):
             return processed_data  # return error message if preprocessing failed
 
-        # Predictions
-        pred_encoded = model.predict(processed_data)
-        pred_proba = model.predict_proba(processed_data)
-
-        pred_labels = label_encoder.inverse_transform(pred_encoded.astype(int))
-        pred_confidence = np.max(pred_proba, axis=1)
-
-        # Attach results to DataFrame
-        df_output = df_raw.copy()
-        df_output["predicted_class"] = pred_labels
-        df_output["confidence"] = pred_confidence
-
-        # Add class probabilities
-        for i, class_name in enumerate(label_encoder.classes_):
-            df_output[f"prob_{class_name}"] = pred_proba[:, i]
-
-        return df_output
+        # Predictions; the class is the most probable one, as in XGBClassifier.predict
+        decided_by = None
+        with stage("predict"):
+            if "booster" in loaded.artifacts:
+                booster, flat = loaded.artifacts["booster"], loaded.artifacts["flat_trees"]
+                pred_proba, decided_by = cascade_proba(loaded.artifacts["cascade"], processed_data,
+                                                       lambda X: predict_proba(booster, X, flat))
+                pred_encoded = np.argmax(pred_proba, axis=1)
+            else:
+                model = loaded.artifacts["model"]
+                pred_encoded = model.predict(processed_data)
+                pred_proba = model.predict_proba(processed_data)
+
+        # Attach class, confidence and class probabilities to the input, without copying it
+        with stage("output"):
+            pred_labels = class_labels(pred_encoded, label_encoder.classes_)
+            return prediction_frame(df_raw, pred_labels, pred_proba, label_encoder.classes_, decided_by)
 
     except Exception as e:
         return f"K2 prediction failed: {str(e)}"
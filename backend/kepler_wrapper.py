@@ -2,88 +2,140 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+import xgboost as xgb
+from inference import model_registry
+from inference.preprocess import CompiledTransform, imputer_fill_values
+from inference.profiling import stage
+from inference.booster import iteration_range
+from inference.flat_trees import compile_flat_trees, use_flat_trees
+from inference.cascade import compile_cascade, cascade_proba
+from inference.output import class_labels, prediction_frame
 
-script_dir = os.path.dirname(os.path.abspath(__file__))
-models_dir = os.path.join(script_dir, "models")
+MODEL_TYPE = "kepler"
+MODEL_FILES = ["kepler_preprocess.pkl", "kepler.pkl"]
+# Each output row depends only on its own input row, so rows can be batched together
+ROW_INDEPENDENT = True
+# Fewest recognised input columns an upload needs to be scored by this model
+MIN_OVERLAP = 10
+# Features a manual or JSON batch request must give a value for
+REQUIRED_FEATURES = [
+    'koi_score', 'koi_period', 'koi_depth', 'koi_prad',
+    'koi_teq', 'koi_insol', 'koi_model_snr', 'koi_steff', 'koi_slogg', 'koi_srad'
+]
 
-# Load preprocessing objects
-with open(os.path.join(models_dir, "kepler_preprocess.pkl"), "rb") as f:
-    preprocess_objs = pickle.load(f)
+# Fallback to common Kepler features when the preprocessing objects carry no feature_names
+DEFAULT_FEATURES = [
+    'koi_score', 'koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec',
+    'koi_period', 'koi_period_err1', 'koi_period_err2', 'koi_time0bk_err1', 'koi_time0bk_err2',
+    'koi_impact', 'koi_impact_err1', 'koi_impact_err2', 'koi_duration', 'koi_duration_err1',
+    'koi_duration_err2', 'koi_depth', 'koi_depth_err1', 'koi_depth_err2', 'koi_prad',
+    'koi_prad_err1', 'koi_prad_err2', 'koi_teq', 'koi_insol', 'koi_insol_err1',
+    'koi_insol_err2', 'koi_model_snr', 'koi_tce_plnt_num', 'koi_steff', 'koi_steff_err1',
+    'koi_steff_err2', 'koi_slogg', 'koi_slogg_err1', 'koi_slogg_err2', 'koi_srad',
+    'koi_srad_err1', 'koi_srad_err2', 'koi_kepmag'
+]
 
-# Load trained model
-with open(os.path.join(models_dir, "kepler.pkl"), "rb") as f:
-    model = pickle.load(f)
+def load(models_dir, shared):
+    """Load Kepler preprocessing objects and trained model"""
+    with open(os.path.join(models_dir, "kepler_preprocess.pkl"), "rb") as f:
+        preprocess_objs = pickle.load(f)
 
-def preprocess_data(df):
+    # Get expected features from preprocessing objects
+    expected_features = preprocess_objs.get('feature_names', DEFAULT_FEATURES)
+
+    # Feature mapping and imputation compiled into one vectorized transform
+    fill = None
+    if 'imputer' in preprocess_objs:
+        fill = imputer_fill_values(preprocess_objs['imputer'], expected_features)
+    transform = CompiledTransform(expected_features, fill=fill).share(shared)
+
+    with open(os.path.join(models_dir, "kepler.pkl"), "rb") as f:
+        model = pickle.load(f)
+    # Trees are compiled from XGBoost models only; any other classifier predicts through the model itself
+    booster = model.get_booster() if isinstance(model, xgb.XGBModel) else None
+
+    return {
+        "preprocess_objs": preprocess_objs,
+        "input_features": list(expected_features),
+        "transform": transform,
+        "model": model,
+        # Single rows and small batches (/predict/manual) walk flat arrays instead
+        "flat_trees": compile_flat_trees(booster, iteration_range(booster), shared) if booster is not None else None,
+        # Large batches optionally go through the first rounds only, then the whole ensemble for unsure rows
+        "cascade": compile_cascade(MODEL_TYPE, booster, iteration_range(booster)) if booster is not None else None,
+    }
+
+def __getattr__(name):
+    """Expose the loaded artifacts (preprocess_objs, model) as module attributes"""
+    if not name.startswith("__"):
+        artifacts = model_registry.get(MODEL_TYPE).artifacts
+        if name in artifacts:
+            return artifacts[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def preprocess_data(df, loaded=None):
     """Preprocess input data for Kepler model"""
     try:
-        # Get expected features from preprocessing objects
-        if 'feature_names' in preprocess_objs:
-            expected_features = preprocess_objs['feature_names']
-        else:
-            # Fallback to common Kepler features
-            expected_features = [
-                'koi_score', 'koi_fpflag_nt', 'koi_fpflag_ss', 'koi_fpflag_co', 'koi_fpflag_ec',
-                'koi_period', 'koi_period_err1', 'koi_period_err2', 'koi_time0bk_err1', 'koi_time0bk_err2',
-                'koi_impact', 'koi_impact_err1', 'koi_impact_err2', 'koi_duration', 'koi_duration_err1',
-                'koi_duration_err2', 'koi_depth', 'koi_depth_err1', 'koi_depth_err2', 'koi_prad',
-                'koi_prad_err1', 'koi_prad_err2', 'koi_teq', 'koi_insol', 'koi_insol_err1',
-                'koi_insol_err2', 'koi_model_snr', 'koi_tce_plnt_num', 'koi_steff', 'koi_steff_err1',
-                'koi_steff_err2', 'koi_slogg', 'koi_slogg_err1', 'koi_slogg_err2', 'koi_srad',
-                'koi_srad_err1', 'koi_srad_err2', 'koi_kepmag'
-            ]
-        
+        loaded = loaded or model_registry.get(MODEL_TYPE)
+        preprocess_objs = loaded.artifacts['preprocess_objs']
+        transform = loaded.artifacts['transform']
+
         # Keep only overlapping columns
-        overlap = [c for c in df.columns if c in expected_features]
+        overlap = transform.overlap(df)
         
-        if len(overlap) < 10:
+        if len(overlap) < MIN_OVERLAP:
             return f"Input data does not have enough valid Kepler features (found only {len(overlap)})"
         
-        # Create DataFrame with expected features
-        processed_df = pd.DataFrame()
-        for feature in expected_features:
-            if feature in df.columns:
-                processed_df[feature] = df[feature]
-            else:
-                processed_df[feature] = np.nan
+        # Matrix of expected features, NaN where the input lacks one
+        with stage('preprocess'):
+            processed = transform.gather(df)
         
         # Apply preprocessing if available
         if 'imputer' in preprocess_objs:
-            processed_df = pd.DataFrame(
-                preprocess_objs['imputer'].transform(processed_df),
-                columns=processed_df.columns
-            )
+            with stage('impute'):
+                processed = transform.impute(processed)
         
-        return processed_df
+        return transform.select(processed)
     except Exception as e:
         return f"Preprocessing failed: {str(e)}"
 
-def predict(df):
+def predict(df, loaded=None):
     """Make predictions using Kepler model"""
     try:
+        loaded = loaded or model_registry.get(MODEL_TYPE)
+        preprocess_objs = loaded.artifacts['preprocess_objs']
+        model = loaded.artifacts['model']
+
         # Preprocess data
-        processed_df = preprocess_data(df)
+        processed_df = preprocess_data(df, loaded)
         
         # Check if preprocessing returned an error
         if isinstance(processed_df, str):
             return processed_df
         
         # Make predictions
-        predictions = model.predict(processed_df)
-        
-        # Convert predictions to string labels
-        if 'label_encoder' in preprocess_objs:
-            pred_labels = preprocess_objs['label_encoder'].inverse_transform(predictions.astype(int))
-        else:
-            # Default mapping for 3 classes
-            label_map = {0: 'FALSE POSITIVE', 1: 'CANDIDATE', 2: 'CONFIRMED'}
-            pred_labels = [label_map.get(int(p), 'UNKNOWN') for p in predictions]
-        
-        # Build result DataFrame with predicted_class column
-        df_output = df.copy()
-        df_output["predicted_class"] = pred_labels
+        decided_by = None
+        with stage('predict'):
+            if use_flat_trees(loaded.artifacts['flat_trees'], len(processed_df)):
+                predictions = np.argmax(loaded.artifacts['flat_trees'].predict_proba(processed_df), axis=1)
+            elif loaded.artifacts['cascade'] is not None:
+                proba, decided_by = cascade_proba(loaded.artifacts['cascade'], processed_df, model.predict_proba)
+                predictions = np.argmax(proba, axis=1)
+            else:
+                predictions = model.predict(processed_df)
         
-        return df_output
+        with stage('output'):
+            # Convert predictions to string labels
+            if 'label_encoder' in preprocess_objs:
+                pred_labels = class_labels(predictions, preprocess_objs['label_encoder'].classes_)
+            else:
+                # Default mapping for 3 classes
+                label_map = {0: 'FALSE POSITIVE', 1: 'CANDIDATE', 2: 'CONFIRMED'}
+                pred_labels = pd.Categorical([label_map.get(int(p), 'UNKNOWN') for p in predictions],
+                                             categories=[*label_map.values(), 'UNKNOWN'])
+            
+            # Input with the predicted_class column appended, without copying it
+            return prediction_frame(df, pred_labels, decided_by=decided_by)
         
     except Exception as e:
         return f"Kepler prediction failed: {str(e)}"
@@ -4,6 +4,9 @@ from .download_routes import download_bp
 from .chat_routes import chat_bp
 from .search_routes import search_bp
 from .query_routes import query_bp
+from .job_routes import job_bp
+from .result_routes import result_bp
+from .model_routes import model_bp
 
 def register_routes(app):
     """Register all route blueprints with the Flask app"""
@@ -12,4 +15,7 @@ def register_routes(app):
     app.register_blueprint(download_bp, url_prefix='/api')
     app.register_blueprint(chat_bp, url_prefix='/api')
     app.register_blueprint(search_bp, url_prefix='/api')
-    app.register_blueprint(query_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(query_bp, url_prefix='/api')
+    app.register_blueprint(job_bp, url_prefix='/api')
+    app.register_blueprint(result_bp, url_prefix='/api')
+    app.register_blueprint(model_bp, url_prefix='/api')
\ No newline at end of file
@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify, send_file, current_app
+from flask import Blueprint, jsonify, send_file, request
+import mimetypes
 import os
 from werkzeug.utils import secure_filename
+from inference.result_store import result_store
 
 download_bp = Blueprint('download', __name__)
 
@@ -12,14 +14,35 @@ def download_file(filename):
         if not filename or '..' in filename:
             return jsonify({'error': 'Invalid filename'}), 400
             
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        # Ensure file is within upload directory
-        if not os.path.abspath(filepath).startswith(os.path.abspath(current_app.config['UPLOAD_FOLDER'])):
+        # Results are served from the store's folder (RESULTS_FOLDER), where they are written
+        filepath = result_store.path(filename)
+        # Ensure file is within the results directory
+        if not os.path.abspath(filepath).startswith(os.path.abspath(result_store.folder)):
             return jsonify({'error': 'Access denied'}), 403
             
-        if os.path.exists(filepath):
-            return send_file(filepath, as_attachment=True, download_name=filename)
-        else:
+        if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 404
+
+        # A download counts as a use of a stored result, restarting its expiry
+        if result_store.is_result(filename):
+            result_store.touch(filename)
+
+        # CSV results go out gzip-compressed to clients that accept it; Range
+        # requests (resumed downloads) are answered by send_file either way
+        gz_path = None
+        if request.accept_encodings['gzip']:
+            gz_path = result_store.compressed(filename)
+        if gz_path is None:
+            response = send_file(filepath, as_attachment=True, download_name=filename)
+        else:
+            response = send_file(
+                gz_path,
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                as_attachment=True,
+                download_name=filename
+            )
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,207 @@
+from flask import Blueprint, jsonify, request, current_app
+import os
+from werkzeug.utils import secure_filename
+from inference import model_registry
+from inference.jobs import job_manager, JobQueueFull
+from inference.streaming import predict_stream
+from inference.formats import CHUNKED_FORMATS, count_rows, read_header, read_table, select_columns, write_result
+from inference.uploads import save_upload, upload_digest
+from inference.result_store import result_store
+from inference.materialize import refresh_predictions
+from inference.execution import execution_engine
+from inference.summary import SUMMARY_FIELDS, summarize
+from database import ALLOWED_TABLES
+from .prediction_routes import allowed_file, result_format_error, output_columns_error, overlap_error
+
+job_bp = Blueprint('jobs', __name__)
+
+def prediction_job(upload_path, file_ext, model_type, file_hash, filename, result_format, all_columns=False):
+    """Build the background task for one uploaded file"""
+    def run(progress):
+        try:
+            loaded = model_registry.get(model_type)
+            result_filename = result_store.name_for(file_hash, model_type, loaded.version, result_format, all_columns)
+            result_path = result_store.path(result_filename)
+            
+            # Identical upload already scored by this model version
+            stored = result_store.lookup(result_filename)
+            if stored is not None:
+                summary = {field: stored[field] for field in SUMMARY_FIELDS if field in stored}
+                return {
+                    **summary,
+                    'cached': True,
+                    'model_version': loaded.version,
+                    'download_url': f'/api/download/{result_filename}',
+                    'predictions_url': f'/api/results/{result_filename}/predictions'
+                }
+            
+            header = read_header(upload_path, file_ext)
+            error = overlap_error(loaded, header)
+            if error:
+                return error
+            usecols, float_columns = select_columns(header, loaded.read_columns, all_columns)
+            
+            if file_ext in CHUNKED_FORMATS:
+                progress.set_total(count_rows(upload_path, file_ext))
+                summary = predict_stream(loaded, upload_path, file_ext, result_path, result_format,
+                                         progress=progress.update, usecols=usecols, float_columns=float_columns)
+                if isinstance(summary, str):  # Error message
+                    return summary
+                preview = summary.pop('preview')
+            else:  # xls
+                data = read_table(upload_path, file_ext, usecols, float_columns)
+                progress.set_total(len(data))
+                predictions = loaded.predict(data)
+                if isinstance(predictions, str):  # Error message
+                    return predictions
+                write_result(predictions, result_path, result_format)
+                summary = summarize(predictions)
+                preview = summary.pop('preview')
+        finally:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+
+        # Stored like a synchronous /predict result so either path can reuse it
+        result_store.put(result_filename, {
+            **summary,
+            'predictions': preview,
+            'model_type': model_type,
+            'model_version': loaded.version,
+            'file_hash': file_hash,
+            'filename': filename,
+            'result_format': result_format,
+            'output_columns': 'all' if all_columns else 'model',
+            'streamed': file_ext in CHUNKED_FORMATS
+        })
+        return {
+            **summary,
+            'cached': False,
+            'model_version': loaded.version,
+            'execution': execution_engine.settings(model_type),
+            'download_url': f'/api/download/{result_filename}',
+            'predictions_url': f'/api/results/{result_filename}/predictions'
+        }
+    return run
+
+@job_bp.route('/jobs/predict', methods=['POST'])
+def submit_prediction_job():
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        model_type = request.form.get('type', 'k2')
+        
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Only CSV, Excel, Parquet and Feather/Arrow files are allowed'}), 400
+        
+        if model_type not in model_registry.model_types:
+            return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
+        
+        result_format = request.form.get('format', 'csv').lower()
+        if result_format_error(result_format):
+            return result_format_error(result_format)
+        
+        output_columns = request.form.get('columns', 'all').lower()
+        if output_columns_error(output_columns):
+            return output_columns_error(output_columns)
+        
+        # The job outlives the request, so its upload goes to disk under a unique name
+        filename = secure_filename(file.filename)
+        file_ext = filename.rsplit('.', 1)[1].lower()
+        job_id = job_manager.new_id()
+        file_hash, _ = upload_digest(file)
+        upload_path = save_upload(file, current_app.config['UPLOAD_FOLDER'], file_ext)
+        
+        # A file the model cannot score is rejected from its header before it is queued, when
+        # the model is already loaded here; otherwise the job checks it after loading the model
+        loaded = model_registry.get_if_loaded(model_type)
+        error = loaded and overlap_error(loaded, read_header(upload_path, file_ext))
+        if error:
+            os.remove(upload_path)
+            return jsonify({'error': error}), 400
+        
+        try:
+            job_manager.submit(
+                job_id,
+                prediction_job(upload_path, file_ext, model_type, file_hash, filename, result_format,
+                               output_columns == 'all'),
+                model_type=model_type,
+                filename=filename
+            )
+        except JobQueueFull as e:
+            os.remove(upload_path)
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'progress_url': f'/api/jobs/{job_id}/progress'
+        }), 202
+        
+    except Exception as e:
+        if 'upload_path' in locals() and os.path.exists(upload_path):
+            os.remove(upload_path)
+        return jsonify({'error': str(e)}), 500
+
+def materialize_job(tables):
+    """Background task refreshing the stored predictions of each table in turn"""
+    def run(progress):
+        summaries = {}
+        rows_before = 0
+        for table_name in tables:
+            def report(rows_done, total_rows):
+                if rows_done == 0:
+                    progress.set_total(rows_before + total_rows)
+                progress.update(rows_before + rows_done)
+            
+            summary = refresh_predictions(table_name, progress=report)
+            if isinstance(summary, str):  # Error message
+                return summary
+            summaries[table_name] = summary
+            rows_before += summary['rows_scored']
+        return {'rows_processed': rows_before, 'tables': summaries}
+    return run
+
+@job_bp.route('/jobs/materialize', methods=['POST'])
+def submit_materialize_job():
+    try:
+        data = request.get_json(silent=True) or {}
+        tables = data.get('tables') or ALLOWED_TABLES
+        invalid = [t for t in tables if t not in ALLOWED_TABLES]
+        if invalid:
+            return jsonify({'error': f'Invalid table name: {invalid}'}), 400
+        
+        job_id = job_manager.new_id()
+        try:
+            job_manager.submit(job_id, materialize_job(tables), tables=tables)
+        except JobQueueFull as e:
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'progress_url': f'/api/jobs/{job_id}/progress'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    record = job_manager.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({**record, 'progress': job_manager.progress(record)})
+
+@job_bp.route('/jobs/<job_id>/progress', methods=['GET'])
+def get_job_progress(job_id):
+    record = job_manager.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_manager.progress(record))
@@ -0,0 +1,53 @@
+from flask import Blueprint, jsonify, request
+import hmac
+import os
+from inference import model_registry
+
+model_bp = Blueprint('models', __name__)
+
+# Required in the X-Admin-Token header to switch model releases; unset disables switching
+ADMIN_TOKEN = os.getenv('MODEL_ADMIN_TOKEN', '')
+
+def admin_error():
+    """Error response when the request may not administer models, None when it may"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Model administration is disabled (MODEL_ADMIN_TOKEN is not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+@model_bp.route('/models', methods=['GET'])
+def get_models():
+    """Serving version, active and available releases of every model type in this worker"""
+    try:
+        return jsonify({'models': model_registry.status()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@model_bp.route('/models/<model_type>/activate', methods=['POST'])
+def activate_model(model_type):
+    """Load and warm up a release of a model, then swap it in (other workers follow via the watcher)"""
+    try:
+        if admin_error():
+            return admin_error()
+        if model_type not in model_registry.model_types:
+            return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
+
+        data = request.get_json(silent=True) or {}
+        release = data.get('release')
+        if not release:
+            return jsonify({'error': 'No release provided'}), 400
+        if release not in model_registry.releases(model_type):
+            return jsonify({'error': f'Release "{release}" of {model_type} not found'}), 404
+
+        # Requests keep being served by the current version while the release loads
+        loaded = model_registry.activate(model_type, release)
+        return jsonify({
+            'model_type': model_type,
+            'model_version': loaded.version,
+            'release': loaded.release,
+            'load_seconds': round(loaded.load_seconds, 4),
+            'warmup_seconds': round(loaded.warmup_seconds, 4)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,18 +1,45 @@
 from flask import Blueprint, jsonify, request, current_app
-import pandas as pd
-import os
-import threading
-import time
+import json
 from werkzeug.utils import secure_filename
-from k2_wrapper import predict as k2_predict
-from toi_wrapper import predict as toi_predict
-from kepler_wrapper import predict as kepler_predict
+from inference import model_registry
+from inference.streaming import predict_stream
+from inference.formats import (INPUT_FORMATS, CHUNKED_FORMATS, RESULT_FORMATS, OUTPUT_COLUMNS, read_header,
+                               read_table, select_columns, write_result)
+from inference.fanout import (AUTO_MODEL_TYPE, available_models, match_models, models_version, no_match_error,
+                              predict_all)
+from inference.uploads import upload_digest, upload_source
+from inference.result_store import result_store
+from inference.batching import predict_row, batching_stats
+from inference.execution import execution_engine
+from inference.summary import PREVIEW_ROWS, summarize
+from inference.columnar import columnar_frame, feature_frame
+from .result_routes import is_prediction_column
+from .utils import prediction_cache, feature_key
 
 prediction_bp = Blueprint('prediction', __name__)
 
 def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in INPUT_FORMATS
+
+def result_format_error(result_format):
+    """Error response for an unknown format= value, None when it is valid"""
+    if result_format not in RESULT_FORMATS:
+        return jsonify({'error': f'Result format "{result_format}" not supported. Choose one of {list(RESULT_FORMATS)}'}), 400
+    return None
+
+def output_columns_error(output_columns):
+    """Error response for an unknown columns= value, None when it is valid"""
+    if output_columns not in OUTPUT_COLUMNS:
+        return jsonify({'error': f'columns must be one of {list(OUTPUT_COLUMNS)}'}), 400
+    return None
+
+def overlap_error(loaded, header):
+    """Error message when an upload's header has too few of the model's input features, else None"""
+    match = match_models(header, {loaded.model_type: loaded})[loaded.model_type]
+    if match['qualifies']:
+        return None
+    return (f"Need at least {match['min_overlap']} of the {loaded.model_type.upper()} model's input features, "
+            f"found {match['overlap']}")
 
 @prediction_bp.route('/predict', methods=['POST'])
 def predict_data():
@@ -27,84 +54,225 @@ def predict_data():
             return jsonify({'error': 'No file selected'}), 400
         
         if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Only CSV and Excel files are allowed'}), 400
+            return jsonify({'error': 'Invalid file type. Only CSV, Excel, Parquet and Feather/Arrow files are allowed'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        if model_type not in model_registry.model_types and model_type != AUTO_MODEL_TYPE:
+            return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
+        
+        result_format = request.form.get('format', 'csv').lower()
+        if result_format_error(result_format):
+            return result_format_error(result_format)
         
-        # Read file based on extension
+        # Every upload column is carried into the result unless columns=model, which parses and keeps only the model's
+        output_columns = request.form.get('columns', 'all').lower()
+        if output_columns_error(output_columns):
+            return output_columns_error(output_columns)
+        all_columns = output_columns == 'all'
+        
+        # The upload was hashed while the request was parsed; it is read from that buffer
+        filename = secure_filename(file.filename)
         file_ext = filename.rsplit('.', 1)[1].lower()
-        if file_ext == 'csv':
-            data = pd.read_csv(filepath,on_bad_lines="skip",comment='#')
-        else:  # xlsx or xls
-            data = pd.read_excel(filepath)
+        file_hash, file_size = upload_digest(file)
+        
+        if model_type == AUTO_MODEL_TYPE:
+            return predict_auto(file, filename, file_ext, file_hash, file_size, result_format, all_columns)
+        
+        # The same file already scored by this model version is served from the result store
+        loaded = model_registry.get(model_type)
+        result_filename = result_store.name_for(file_hash, model_type, loaded.version, result_format, all_columns)
+        stored = result_store.lookup(result_filename)
+        if stored is not None:
+            return jsonify(result_response(stored, cached=True))
+        
+        # The header alone tells whether the model recognises the file, before any row is parsed
+        header = read_header(upload_source(file), file_ext)
+        error = overlap_error(loaded, header)
+        if error:
+            return jsonify({
+                'predictions': [],
+                'model_type': model_type,
+                'model_version': loaded.version,
+                'rows_processed': 0,
+                'error': error
+            })
+        # Only the model's columns are parsed (as float64) unless every column goes into the result
+        usecols, float_columns = select_columns(header, loaded.read_columns, all_columns)
+        
+        result_meta = {
+            'model_type': model_type,
+            'model_version': loaded.version,
+            'file_hash': file_hash,
+            'filename': filename,
+            'result_format': result_format,
+            'output_columns': output_columns
+        }
+        
+        # Large uploads (or stream=true) are predicted chunk by chunk
+        stream = request.form.get('stream', '').lower() == 'true'
+        if file_ext in CHUNKED_FORMATS and (stream or file_size > current_app.config['STREAM_THRESHOLD_BYTES']):
+            return predict_streamed(file, file_ext, loaded, result_filename, result_meta, usecols, float_columns)
+        if file_size > current_app.config['MAX_IN_MEMORY_UPLOAD_BYTES']:
+            return jsonify({'error': 'File too large for in-memory parsing. Upload large datasets as CSV, Parquet or Feather'}), 413
+        
+        data = read_table(upload_source(file), file_ext, usecols, float_columns)
         
         # Predict based on model type
-        if model_type == 'k2':
-            predictions = k2_predict(data)
-        elif model_type == 'toi':
-            predictions = toi_predict(data)
-        elif model_type == 'kepler':
-            predictions = kepler_predict(data)
-        else:
-            return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
+        predictions = loaded.predict(data)
         
         # Handle prediction result for error strings
         if isinstance(predictions, str):  # Error message
-            os.remove(filepath)  # Clean up uploaded file
             return jsonify({
                 'predictions': [],
                 'model_type': model_type,
+                'model_version': loaded.version,
                 'rows_processed': len(data),
                 'error': predictions
             })
         
-        # Clean up uploaded file
-        os.remove(filepath)
-        
-        # Handle different wrapper outputs
-        if model_type in ['k2', 'toi', 'kepler']:
-            # These wrappers return DataFrame with predicted_class column
-            data = predictions
-            predictions = predictions['predicted_class'].tolist()
-        else:
-            # Add predictions to original data
-            data['exoplanet_prediction'] = predictions
-        
-        # Save result as CSV
-        result_filename = f'predictions_{model_type}_{filename.rsplit(".", 1)[0]}.csv'
-        result_path = os.path.join(current_app.config['UPLOAD_FOLDER'], result_filename)
-        data.to_csv(result_path, index=False)
-        
-        # Schedule cleanup of result file after 5 min
-        def cleanup_result():
-            time.sleep(300)  # 5 min
-            if os.path.exists(result_path):
-                os.remove(result_path)
-        
-        cleanup_thread = threading.Thread(target=cleanup_result)
-        cleanup_thread.daemon = True
-        cleanup_thread.start()
-        
-        # Convert predictions to list if it's a numpy array
-        if hasattr(predictions, 'tolist'):
-            predictions = predictions.tolist()
-        
-        return jsonify({
-            'predictions': predictions,
-            'model_type': model_type,
-            'rows_processed': len(data),
-            'download_url': f'/api/download/{result_filename}'
+        # Save result under the upload's hash; it expires after 5 min unused
+        write_result(predictions, result_store.path(result_filename), result_format)
+        summary = summarize(predictions)
+        preview = summary.pop('preview')
+        result_store.put(result_filename, {
+            **result_meta,
+            **summary,
+            'predictions': preview
         })
         
+        return jsonify(result_response(result_store.lookup(result_filename), cached=False))
+        
     except Exception as e:
-        # Clean up file if it exists
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'error': str(e)}), 500
 
+def predict_auto(file, filename, file_ext, file_hash, file_size, result_format, all_columns=False):
+    """Parse the upload once and score it with every model whose features it covers"""
+    models, load_errors = available_models()
+    result_filename = result_store.name_for(file_hash, AUTO_MODEL_TYPE, models_version(models), result_format,
+                                            all_columns)
+    stored = result_store.lookup(result_filename)
+    if stored is not None:
+        return jsonify(result_response(stored, cached=True))
+    
+    if file_size > current_app.config['MAX_IN_MEMORY_UPLOAD_BYTES']:
+        return jsonify({'error': 'File too large for automatic model selection. Choose a model type for large datasets'}), 413
+    
+    header = read_header(upload_source(file), file_ext)
+    matches = match_models(header, models)
+    error = no_match_error(matches)
+    if error:
+        return jsonify({
+            'predictions': [],
+            'model_type': AUTO_MODEL_TYPE,
+            'model_version': models_version(models),
+            'rows_processed': 0,
+            'error': error,
+            'load_errors': load_errors or None
+        })
+    model_columns = [c for model_type, match in matches.items() if match['qualifies']
+                     for c in models[model_type].read_columns]
+    usecols, float_columns = select_columns(header, model_columns, all_columns)
+    
+    data = read_table(upload_source(file), file_ext, usecols, float_columns)
+    result = predict_all(data, models)
+    
+    if isinstance(result, str):  # Error message
+        return jsonify({
+            'predictions': [],
+            'model_type': AUTO_MODEL_TYPE,
+            'model_version': models_version(models),
+            'rows_processed': len(data),
+            'error': result,
+            'load_errors': load_errors or None
+        })
+    
+    combined, matches = result
+    for model_type, error in load_errors.items():
+        matches[model_type] = {'qualifies': False, 'error': error}
+    # The inline predictions come from the model that recognises most of its features
+    scored = [t for t, m in matches.items() if 'class_counts' in m]
+    primary = max(scored, key=lambda t: matches[t]['overlap'] / len(models[t].artifacts['input_features']))
+    
+    write_result(combined, result_store.path(result_filename), result_format)
+    summary = summarize(combined, prefix=f'{primary}_')
+    preview = summary.pop('preview')
+    result_store.put(result_filename, {
+        **summary,
+        'predictions': preview,
+        'model_type': AUTO_MODEL_TYPE,
+        'model_version': models_version(models),
+        'primary_model': primary,
+        'models': matches,
+        'file_hash': file_hash,
+        'filename': filename,
+        'result_format': result_format,
+        'output_columns': 'all' if all_columns else 'model'
+    })
+    return jsonify(result_response(result_store.lookup(result_filename), cached=False))
+
+def result_response(meta, cached):
+    """Response body for a stored prediction result.
+
+    Its size does not depend on the number of rows: a summary and the first
+    PREVIEW_ROWS predictions, with every row available from predictions_url.
+    """
+    response = {
+        'predictions': meta['predictions'][:PREVIEW_ROWS],
+        'model_type': meta['model_type'],
+        'model_version': meta['model_version'],
+        'rows_processed': meta['rows_processed'],
+        'class_counts': meta.get('class_counts'),
+        'mean_confidence': meta.get('mean_confidence'),
+        'confidence_histogram': meta.get('confidence_histogram'),
+        'decided_by': meta.get('decided_by'),
+        'download_url': f"/api/download/{meta['result_file']}",
+        'predictions_url': f"/api/results/{meta['result_file']}/predictions",
+        'result_format': meta.get('result_format', 'csv'),
+        'output_columns': meta.get('output_columns', 'all'),
+        'cached': cached
+    }
+    if meta.get('streamed'):
+        response['streamed'] = True
+    if meta['model_type'] == AUTO_MODEL_TYPE:
+        response['primary_model'] = meta['primary_model']
+        response['models'] = meta['models']
+    return response
+
+def predict_streamed(file, file_ext, loaded, result_filename, result_meta, usecols=None, float_columns=()):
+    """Chunked prediction of an upload; memory is bounded by the chunk size"""
+    summary = predict_stream(loaded, upload_source(file), file_ext, result_store.path(result_filename),
+                             result_meta['result_format'], usecols=usecols, float_columns=float_columns)
+    
+    if isinstance(summary, str):  # Error message
+        return jsonify({
+            'predictions': [],
+            'model_type': loaded.model_type,
+            'model_version': loaded.version,
+            'rows_processed': 0,
+            'error': summary
+        })
+    
+    # Only a preview of the predictions is returned inline, the full set is in the result file
+    preview = summary.pop('preview')
+    result_store.put(result_filename, {
+        **result_meta,
+        **summary,
+        'predictions': preview,
+        'streamed': True
+    })
+    return jsonify(result_response(result_store.lookup(result_filename), cached=False))
+
+def manual_result(prediction):
+    """Class, confidence and class probabilities of a one-row wrapper output"""
+    row = prediction.iloc[0]
+    probabilities = {
+        col[len('prob_'):]: float(row[col]) for col in prediction.columns if col.startswith('prob_')
+    }
+    return {
+        'predicted_class': str(row['predicted_class']),
+        'confidence': float(row['confidence']) if 'confidence' in prediction.columns else None,
+        'probabilities': probabilities or None
+    }
+
 @prediction_bp.route('/predict/manual', methods=['POST'])
 def predict_manual():
     try:
@@ -115,22 +283,10 @@ def predict_manual():
         features = data.get('features', {})
         model_type = data.get('type', 'k2')
         
-        # Get required features based on model type
-        if model_type == 'kepler':
-            required_features = [
-                'koi_score', 'koi_period', 'koi_depth', 'koi_prad',
-                'koi_teq', 'koi_insol', 'koi_model_snr', 'koi_steff', 'koi_slogg', 'koi_srad'
-            ]
-        elif model_type == 'toi':
-            required_features = [
-                'pl_eqt', 'pl_tranmid_snr', 'st_tmag', 'pl_orbper_snr', 'pl_trandurherr2',
-                'st_dist', 'pl_insol', 'depth_mag_ratio', 'pl_tranmid', 'dec', 'pl_orbper', 'pl_rade'
-            ]
-        else:  # k2
-            required_features = [
-                'sy_snum', 'sy_pnum', 'disc_year', 'pl_orbper', 'pl_orbpererr1',
-                'pl_rade', 'pl_radeerr1', 'pl_radeerr2', 'ttv_flag', 'st_teff'
-            ]
+        if model_type not in model_registry.model_types:
+            return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
+        
+        required_features = model_registry.required_features(model_type)
         
         # Validate required features
         missing_features = []
@@ -143,11 +299,11 @@ def predict_manual():
         if missing_features:
             return jsonify({'error': f'Missing required features: {missing_features}'}), 400
         
-        # Convert to DataFrame
+        # Convert to a feature row
         feature_data = {}
         for feature in required_features:
             try:
-                feature_data[feature] = [float(features[feature])]
+                feature_data[feature] = float(features[feature])
             except (ValueError, TypeError):
                 return jsonify({'error': f'Invalid value for {feature}: must be a number'}), 400
         
@@ -156,48 +312,111 @@ def predict_manual():
         for feature, value in optional_features.items():
             if value and str(value).strip():
                 try:
-                    feature_data[feature] = [float(value)]
+                    feature_data[feature] = float(value)
                 except (ValueError, TypeError):
                     pass  # Skip invalid optional features
         
-        df = pd.DataFrame(feature_data)
+        # Resubmitted forms are answered from the cache without running the model
+        loaded = model_registry.get(model_type)
+        cache_key = feature_key(model_type, loaded.version, feature_data)
+        result = prediction_cache.get(cache_key)
+        cached = result is not None
         
-        # Predict based on model type
-        if model_type == 'k2':
-            prediction = k2_predict(df)
-        elif model_type == 'toi':
-            prediction = toi_predict(df)
-        elif model_type == 'kepler':
-            prediction = kepler_predict(df)
-        else:
+        if not cached:
+            # Predict based on model type; concurrent requests are micro-batched
+            prediction = predict_row(loaded, feature_data)
+            
+            # Handle prediction result
+            if isinstance(prediction, str):  # Error message
+                return jsonify({
+                    'predictions': None,
+                    'model_type': model_type,
+                    'model_version': loaded.version,
+                    'rows_processed': 1,
+                    'error': prediction
+                })
+            
+            result = manual_result(prediction)
+            prediction_cache.set(cache_key, result)
+        
+        return jsonify({
+            'predictions': result['predicted_class'],
+            'confidence': result['confidence'],
+            'probabilities': result['probabilities'],
+            'model_type': model_type,
+            'model_version': loaded.version,
+            'rows_processed': 1,
+            'cached': cached
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def prediction_columns(predictions):
+    """Prediction columns of a wrapper output, one list per column, NaN as null"""
+    return {
+        column: json.loads(predictions[column].to_json(orient='values'))
+        for column in predictions.columns if is_prediction_column(column)
+    }
+
+@prediction_bp.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many rows sent as columnar JSON in one wrapper call.
+
+    Body: {"type": ..., "columns": [...], "values": [[...], ...]} with one
+    list per row, or {"type": ..., "features": {"name": [...], ...}} with one
+    list per feature. Every row needs the same features a manual request does.
+    """
+    try:
+        if (request.content_length or 0) > current_app.config['MAX_IN_MEMORY_UPLOAD_BYTES']:
+            return jsonify({'error': 'Batch too large for a JSON request. Upload large datasets as CSV, Parquet or Feather'}), 413
+        
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'No data provided'}), 400
+        
+        model_type = payload.get('type', 'k2')
+        if model_type not in model_registry.model_types:
             return jsonify({'error': f'Model type "{model_type}" not supported'}), 400
         
-        # Handle prediction result
-        if isinstance(prediction, str):  # Error message
+        data = columnar_frame(payload)
+        if isinstance(data, str):  # Error message
+            return jsonify({'error': data}), 400
+        data = feature_frame(data, model_registry.required_features(model_type))
+        if isinstance(data, str):
+            return jsonify({'error': data}), 400
+        
+        loaded = model_registry.get(model_type)
+        predictions = loaded.predict(data)
+        
+        if isinstance(predictions, str):  # Error message
             return jsonify({
                 'predictions': None,
                 'model_type': model_type,
-                'rows_processed': 1,
-                'error': prediction
+                'model_version': loaded.version,
+                'rows_processed': len(data),
+                'error': predictions
             })
         
-        # Handle different wrapper outputs
-        if model_type in ['k2', 'toi', 'kepler']:
-            # These wrappers return DataFrame with predicted_class column
-            result_prediction = prediction['predicted_class'].iloc[0]
-        else:
-            # Handle prediction result
-            if hasattr(prediction, 'tolist'):
-                prediction = prediction.tolist()[0] if len(prediction) > 0 else 'UNKNOWN'
-            elif hasattr(prediction, '__iter__') and not isinstance(prediction, str):
-                prediction = list(prediction)[0] if len(list(prediction)) > 0 else 'UNKNOWN'
-            result_prediction = str(prediction)
-        
+        summary = summarize(predictions)
+        summary.pop('preview')
         return jsonify({
-            'predictions': result_prediction,
+            **summary,
+            'predictions': prediction_columns(predictions),
             'model_type': model_type,
-            'rows_processed': 1
+            'model_version': loaded.version
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@prediction_bp.route('/predict/stats', methods=['GET'])
+def prediction_stats():
+    """Loaded model versions, micro-batching, cache, result store and core usage metrics for this worker"""
+    return jsonify({
+        'models': model_registry.loaded(),
+        'execution': execution_engine.stats(),
+        'batching': batching_stats(),
+        'cache': prediction_cache.stats(),
+        'results': result_store.stats()
+    })
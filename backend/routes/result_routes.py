@@ -0,0 +1,65 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import json
+from werkzeug.utils import secure_filename
+from inference.formats import read_result_rows
+from inference.result_store import result_store
+
+result_bp = Blueprint('results', __name__)
+
+DEFAULT_PAGE_ROWS = 1000
+MAX_PAGE_ROWS = 10000
+
+def is_prediction_column(column):
+    """predicted_class/confidence/prob_*/decided_by columns, with or without an auto result's model prefix"""
+    return column.endswith(('predicted_class', 'confidence', 'decided_by')) or column.startswith('prob_') or '_prob_' in column
+
+def numbered(chunk):
+    """Result chunk with each row's number in the result as its first column"""
+    return chunk.reset_index(names='row')
+
+@result_bp.route('/results/<filename>/predictions', methods=['GET'])
+def get_result_predictions(filename):
+    """Per-row predictions of a stored result, as pages (?offset=&limit=) or streamed NDJSON (?format=ndjson)"""
+    try:
+        filename = secure_filename(filename)
+        if not filename or not result_store.is_result(filename):
+            return jsonify({'error': 'Result not found or expired'}), 404
+        meta = result_store.lookup(filename)
+        if meta is None:
+            return jsonify({'error': 'Result not found or expired'}), 404
+
+        offset = request.args.get('offset', 0, type=int)
+        if offset < 0:
+            return jsonify({'error': 'offset must not be negative'}), 400
+        # Prediction columns only, unless the input columns are asked for too
+        columns = None if request.args.get('columns') == 'all' else is_prediction_column
+        path = result_store.path(filename)
+        result_format = meta.get('result_format', 'csv')
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for chunk in read_result_rows(path, result_format, offset, columns=columns):
+                    # One JSON object per line, NaN as null
+                    yield numbered(chunk).to_json(orient='records', lines=True, force_ascii=False)
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        limit = request.args.get('limit', DEFAULT_PAGE_ROWS, type=int)
+        if not 1 <= limit <= MAX_PAGE_ROWS:
+            return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_ROWS}'}), 400
+
+        rows = []
+        for chunk in read_result_rows(path, result_format, offset, limit, columns=columns):
+            rows.extend(json.loads(numbered(chunk).to_json(orient='records', force_ascii=False)))
+
+        total_rows = meta['rows_processed']
+        next_offset = offset + len(rows)
+        return jsonify({
+            'rows': rows,
+            'offset': offset,
+            'limit': limit,
+            'total_rows': total_rows,
+            'next_offset': next_offset if next_offset < total_rows else None
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
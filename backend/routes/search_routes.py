@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request
 from sqlalchemy import text
-from database import engine
+from database import engine, ROW_ID_COLUMN
 
 search_bp = Blueprint('search', __name__)
 
@@ -32,6 +32,7 @@ def search_planet():
                     if row:
                         columns = result.keys()
                         planet_data = dict(zip(columns, row))
+                        planet_data.pop(ROW_ID_COLUMN, None)
                         return jsonify({
                             'found': True,
                             'data': planet_data,
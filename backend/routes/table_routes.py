@@ -1,7 +1,11 @@
 from flask import Blueprint, jsonify, request
 from sqlalchemy import text
+import base64
+import json
 import math
-from database import engine, ALLOWED_TABLES
+from database import (engine, ALLOWED_TABLES, NATURAL_KEYS, PREDICTIONS_TABLE, ROW_ID_COLUMN, has_row_id,
+                      key_parts_sql, row_key_sql)
+from inference import model_registry
 
 table_bp = Blueprint('table', __name__)
 
@@ -18,13 +22,39 @@ def get_columns(table_name):
         query = text("SELECT column_name FROM information_schema.columns WHERE table_name = :table_name")
         with engine.connect() as conn:
             result = conn.execute(query, {'table_name': table_name})
-            columns = [row[0] for row in result]
+            columns = [row[0] for row in result if row[0] != ROW_ID_COLUMN]
         return jsonify(columns)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def encode_cursor(table_name, direction, key):
+    """Opaque page cursor: the table, the direction to read in and the key of the row to start after"""
+    payload = json.dumps({'t': table_name, 'd': direction, 'k': key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, table_name):
+    """(direction, key) of a cursor made by encode_cursor for this table; ValueError when it is not one"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, key = payload['d'], payload['k']
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if (payload.get('t') != table_name or direction not in ('next', 'prev') or not isinstance(key, list)
+            or len(key) != len(NATURAL_KEYS[table_name]) + 1 or not all(isinstance(v, str) for v in key)
+            or not key[-1].isdigit()):
+        raise ValueError('Invalid cursor')
+    return direction, key
+
 @table_bp.route('/table/<table_name>/data', methods=['GET'])
 def get_table_data(table_name):
+    """Rows of a table in natural key order.
+
+    Pages are either numbered (?page=, the default) or read from a cursor
+    (?cursor=, empty for the first page): a cursor page seeks the key index
+    to the row after (or before) the cursor, so every page costs the same,
+    and is returned with next_cursor/prev_cursor for the adjacent pages.
+    Cursor pages count the matching rows only with ?count=true.
+    """
     try:
         if table_name not in ALLOWED_TABLES:
             return jsonify({'error': 'Invalid table name'}), 400
@@ -33,6 +63,10 @@ def get_table_data(table_name):
         limit = min(int(request.args.get('limit', 50)), 100)  # Cap limit
         search = request.args.get('search', '').strip()[:100]  # Limit search length
         search_column = request.args.get('search_column', '').strip()
+        with_predictions = request.args.get('predictions', '').lower() == 'true'
+        cursor = request.args.get('cursor')
+        if page < 1 or limit < 1:
+            return jsonify({'error': 'page and limit must be positive'}), 400
         
         # Validate search column
         if search_column:
@@ -43,37 +77,95 @@ def get_table_data(table_name):
                 if search_column not in valid_columns:
                     return jsonify({'error': 'Invalid search column'}), 400
         
-        offset = (page - 1) * limit
+        direction, after = 'next', None
+        if cursor:
+            try:
+                direction, after = decode_cursor(cursor, table_name)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        # Natural key, then the row id for rows sharing a key, is a stable total order
+        key_sql = key_parts_sql(table_name)
+        row_ids = has_row_id(table_name)
+        if row_ids:
+            key_sql.append(f"t.{ROW_ID_COLUMN}")
+        elif cursor is not None:
+            return jsonify({'error': f'Cursor pages of {table_name} need row ids, run python database.py'}), 503
+        key_columns = [f"_key_{i}" for i in range(len(key_sql))]
+        order = 'DESC' if direction == 'prev' else 'ASC'
+        order_sql = 'ORDER BY ' + ', '.join(f"{part} {order}" for part in key_sql)
+        
+        # Optionally attach the materialized predictions of the current model version
+        select_sql = "SELECT t.*, " + ', '.join(f"{part}::text AS {name}" for part, name in zip(key_sql, key_columns))
+        from_sql = f"FROM {table_name} t"
+        join_params = {}
+        if with_predictions:
+            select_sql += (", p.predicted_class, p.confidence AS prediction_confidence,"
+                           " p.probabilities AS prediction_probabilities, p.model_version AS prediction_model_version")
+            from_sql += (f" LEFT JOIN {PREDICTIONS_TABLE} p ON p.table_name = :table_name"
+                         f" AND p.model_version = :model_version AND p.row_key = {row_key_sql(table_name)}")
+            join_params = {'table_name': table_name, 'model_version': model_registry.version(table_name)}
         
         # Build parameterized queries
+        conditions, params, count_params = [], {**join_params}, {}
         if search and search_column:
-            base_query = text(f"SELECT * FROM {table_name} WHERE {search_column}::text ILIKE :search")
-            count_query = text(f"SELECT COUNT(*) FROM {table_name} WHERE {search_column}::text ILIKE :search")
-            data_query = text(f"SELECT * FROM {table_name} WHERE {search_column}::text ILIKE :search LIMIT :limit OFFSET :offset")
-            params = {'search': f'%{search}%', 'limit': limit, 'offset': offset}
-            count_params = {'search': f'%{search}%'}
+            conditions.append(f"t.{search_column}::text ILIKE :search")
+            params['search'] = count_params['search'] = f'%{search}%'
+        count_query = text(f"SELECT COUNT(*) FROM {table_name} t"
+                           + (f" WHERE {conditions[0]}" if conditions else ""))
+        
+        if cursor is None:
+            # Numbered pages for the UI's page jumps
+            page_sql = "LIMIT :limit OFFSET :offset"
+            params.update(limit=limit, offset=(page - 1) * limit)
         else:
-            count_query = text(f"SELECT COUNT(*) FROM {table_name}")
-            data_query = text(f"SELECT * FROM {table_name} LIMIT :limit OFFSET :offset")
-            params = {'limit': limit, 'offset': offset}
-            count_params = {}
+            # One row past the page tells whether there is another page in this direction
+            if after is not None:
+                bounds = [f":after_{i}" for i in range(len(key_sql) - 1)] + ["CAST(:after_id AS bigint)"]
+                conditions.append(f"({', '.join(key_sql)}) {'<' if direction == 'prev' else '>'} ({', '.join(bounds)})")
+                params.update({f"after_{i}": value for i, value in enumerate(after[:-1])}, after_id=after[-1])
+            page_sql = "LIMIT :limit"
+            params['limit'] = limit + 1
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        data_query = text(f"{select_sql} {from_sql} {where_sql} {order_sql} {page_sql}")
         
         with engine.connect() as conn:
             # Get total count
-            total_result = conn.execute(count_query, count_params)
-            total_count = total_result.scalar()
+            total_count = None
+            if cursor is None or request.args.get('count', '').lower() == 'true':
+                total_count = conn.execute(count_query, count_params).scalar()
             
             # Get data
             data_result = conn.execute(data_query, params)
             columns = data_result.keys()
             rows = [dict(zip(columns, row)) for row in data_result]
         
-        return jsonify({
+        more = cursor is not None and len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'prev':
+            rows.reverse()
+        keys = [[row.pop(name) for name in key_columns] for row in rows]
+        for row in rows:
+            row.pop(ROW_ID_COLUMN, None)
+        
+        # Cursors of the pages around this one; a numbered page has them too, to continue by cursor
+        if not row_ids:
+            has_next = has_prev = False
+        elif cursor is None:
+            has_next, has_prev = page * limit < total_count, page > 1
+        elif direction == 'next':
+            has_next, has_prev = more, after is not None
+        else:
+            has_next, has_prev = True, more
+        response = {
             'data': rows,
             'total': total_count,
-            'page': page,
             'limit': limit,
-            'total_pages': math.ceil(total_count / limit)
-        })
+            'next_cursor': encode_cursor(table_name, 'next', keys[-1]) if keys and has_next else None,
+            'prev_cursor': encode_cursor(table_name, 'prev', keys[0]) if keys and has_prev else None
+        }
+        if cursor is None:
+            response.update(page=page, total_pages=math.ceil(total_count / limit))
+        return jsonify(response)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
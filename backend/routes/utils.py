@@ -1,5 +1,9 @@
 from collections import OrderedDict
+import hashlib
+import os
+import threading
 import time
+import numpy as np
 
 class QueryCache:
     def __init__(self, max_size=100, ttl=3600):  # 1 hour TTL
@@ -7,34 +11,67 @@ class QueryCache:
         self.timestamps = {}
         self.max_size = max_size
         self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
     
     def get(self, key):
-        if key in self.cache:
-            if time.time() - self.timestamps[key] < self.ttl:
-                # Move to end (most recently used)
-                self.cache.move_to_end(key)
-                return self.cache[key]
-            else:
-                # Expired
-                del self.cache[key]
-                del self.timestamps[key]
-        return None
+        with self._lock:
+            if key in self.cache:
+                if time.time() - self.timestamps[key] < self.ttl:
+                    # Move to end (most recently used)
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    return self.cache[key]
+                else:
+                    # Expired
+                    del self.cache[key]
+                    del self.timestamps[key]
+            self.misses += 1
+            return None
     
     def set(self, key, value):
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        else:
-            if len(self.cache) >= self.max_size:
-                # Remove oldest
-                oldest = next(iter(self.cache))
-                del self.cache[oldest]
-                del self.timestamps[oldest]
-        
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            else:
+                if len(self.cache) >= self.max_size:
+                    # Remove oldest
+                    oldest = next(iter(self.cache))
+                    del self.cache[oldest]
+                    del self.timestamps[oldest]
+            
+            self.cache[key] = value
+            self.timestamps[key] = time.time()
     
     def __contains__(self, key):
         return self.get(key) is not None
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.cache),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None
+        }
+
+def feature_key(model_type, model_version, features):
+    """Canonical cache key for a feature dict: sorted names, float64 values"""
+    names = sorted(features)
+    # + 0.0 folds -0.0 into 0.0, which the models treat identically
+    values = np.array([features[name] for name in names], dtype=np.float64) + 0.0
+    digest = hashlib.sha256('\x1f'.join(names).encode())
+    digest.update(values.tobytes())
+    return (model_type, model_version, digest.hexdigest())
 
 # Global query cache instance
-query_cache = QueryCache()
\ No newline at end of file
+query_cache = QueryCache()
+
+# Manual predictions keyed by feature_key(); model version in the key prevents stale hits
+prediction_cache = QueryCache(
+    max_size=int(os.getenv('PREDICTION_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('PREDICTION_CACHE_TTL', 3600))
+)
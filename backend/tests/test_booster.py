@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from inference.booster import gives_proba
+
+
+@pytest.mark.parametrize('objective,num_class,expected', [
+    ('multi:softprob', 3, True),
+    ('multi:softmax', 3, False),
+    ('binary:logistic', 0, False),
+])
+def test_gives_proba_only_for_softprob(objective, num_class, expected):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    y = (X[:, 0] > 0).astype(int) + (num_class > 2) * (X[:, 1] > 1)
+    params = {'objective': objective, **({'num_class': num_class} if num_class else {})}
+    booster = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=3)
+
+    assert gives_proba(booster) == expected
+    output = booster.inplace_predict(X)
+    assert (output.ndim == 2) == expected
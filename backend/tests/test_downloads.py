@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+from flask import Flask
+
+# Importing the routes package creates the database engine, which does not connect until used
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/exoplanets')
+
+from inference.result_store import result_store  # noqa: E402
+from routes.download_routes import download_bp  # noqa: E402
+
+RESULT_NAME = 'predictions_k2_0123456789abcdef0123456789abcdef_abcdef123456.csv'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, 'folder', str(tmp_path))
+    monkeypatch.setattr(result_store, 'start_janitor', lambda: None)
+    app = Flask(__name__)
+    app.register_blueprint(download_bp, url_prefix='/api')
+
+    with open(result_store.path(RESULT_NAME), 'w') as f:
+        f.write('predicted_class,confidence\n' + 'CONFIRMED,0.9\n' * 5000)
+    result_store.put(RESULT_NAME, {'rows_processed': 5000})
+    # Stored a while ago, so a download that touched the file would move its mtime
+    past = time.time() - 60
+    os.utime(result_store.path(RESULT_NAME), (past, past))
+    return app.test_client()
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip'])
+def test_download_resumes_with_if_range(client, encoding):
+    first = client.get(f'/api/download/{RESULT_NAME}', headers={'Accept-Encoding': encoding})
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = client.get(f'/api/download/{RESULT_NAME}', headers={'Accept-Encoding': encoding})
+    assert second.headers['ETag'] == etag
+    assert second.headers['Last-Modified'] == first.headers['Last-Modified']
+
+    resumed = client.get(f'/api/download/{RESULT_NAME}',
+                         headers={'Accept-Encoding': encoding, 'Range': 'bytes=100-', 'If-Range': etag})
+    assert resumed.status_code == 206
+    assert resumed.data == first.data[100:]
+
+
+def test_download_refreshes_last_access(client):
+    before = {entry['name']: entry['last_access'] for entry in result_store.entries()}[RESULT_NAME]
+    mtime = os.path.getmtime(result_store.path(RESULT_NAME))
+    time.sleep(0.01)
+    client.get(f'/api/download/{RESULT_NAME}')
+
+    after = {entry['name']: entry['last_access'] for entry in result_store.entries()}[RESULT_NAME]
+    assert after > before
+    assert os.path.getmtime(result_store.path(RESULT_NAME)) == mtime
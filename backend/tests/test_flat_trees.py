@@ -0,0 +1,81 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from inference.booster import iteration_range
+from inference.flat_trees import FlatEnsemble, verification_rows
+from inference.registry import MODELS_DIR
+
+TOLERANCE = 1e-5
+
+
+def booster_proba(booster: xgb.Booster, X: np.ndarray) -> np.ndarray:
+    expected = booster.inplace_predict(X, iteration_range=iteration_range(booster))
+    if expected.ndim == 1:  # binary:logistic
+        expected = np.column_stack([1 - expected, expected])
+    return expected
+
+
+def edge_rows(booster: xgb.Booster) -> np.ndarray:
+    """Rows on, just below and just above the split thresholds, with missing values"""
+    ensemble = FlatEnsemble.from_booster(booster, iteration_range(booster))
+    X = verification_rows(ensemble, booster.num_features())
+    all_missing = np.full((1, booster.num_features()), np.nan)
+    return np.vstack([X, all_missing])
+
+
+def trained_booster(objective: str, num_class: int, seed: int = 0) -> xgb.Booster:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(500, 8))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    y = (np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 1]) > 0).astype(int)
+    if num_class > 2:
+        y += (np.nan_to_num(X[:, 2]) > 1).astype(int)
+    params = {'objective': objective, 'max_depth': 4, 'eta': 0.3, 'seed': seed}
+    if num_class > 2:
+        params['num_class'] = num_class
+    return xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=30)
+
+
+def shipped_booster(pickle_name: str) -> xgb.Booster:
+    path = os.path.join(MODELS_DIR, pickle_name)
+    if not os.path.exists(path):
+        pytest.skip(f"{path} not found")
+    with open(path, 'rb') as f:
+        return pickle.load(f).get_booster()
+
+
+@pytest.mark.parametrize('pickle_name', ['k2.pkl', 'kepler.pkl'])
+def test_shipped_models_match_booster(pickle_name):
+    booster = shipped_booster(pickle_name)
+    X = edge_rows(booster)
+    flat = FlatEnsemble.from_booster(booster, iteration_range(booster))
+    np.testing.assert_allclose(flat.predict_proba(X), booster_proba(booster, X), atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('objective,num_class', [('multi:softprob', 3), ('binary:logistic', 2)])
+def test_trained_models_match_booster(objective, num_class):
+    booster = trained_booster(objective, num_class)
+    X = edge_rows(booster)
+    flat = FlatEnsemble.from_booster(booster)
+    np.testing.assert_allclose(flat.predict_proba(X), booster_proba(booster, X), atol=TOLERANCE)
+
+
+def test_iteration_range_limits_trees():
+    booster = trained_booster('multi:softprob', 3)
+    X = edge_rows(booster)
+    flat = FlatEnsemble.from_booster(booster, (0, 10))
+    expected = booster.inplace_predict(X, iteration_range=(0, 10))
+    np.testing.assert_allclose(flat.predict_proba(X), expected, atol=TOLERANCE)
+
+
+def test_unsupported_booster_raises():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 4))
+    booster = xgb.train({'booster': 'gblinear', 'objective': 'binary:logistic'},
+                        xgb.DMatrix(X, label=(X[:, 0] > 0).astype(int)), num_boost_round=2)
+    with pytest.raises(ValueError):
+        FlatEnsemble.from_booster(booster)
@@ -2,131 +2,251 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+import xgboost as xgb
+from inference import model_registry
+from inference.preprocess import (CompiledTransform, imputer_fill_values, scaler_arrays, outlier_bounds,
+                                  quantile_bounds)
+from inference.profiling import stage
+from inference.booster import iteration_range
+from inference.flat_trees import compile_flat_trees, use_flat_trees
+from inference.cascade import compile_cascade, cascade_proba
+from inference.output import class_labels, prediction_frame
+
+MODEL_TYPE = "toi"
+MODEL_FILES = ["toi_preprocess.pkl", "toi.pkl"]
+# Without stored outlier_stats the fences come from the batch itself, so rows
+# cannot be batched together; load() reports row_independent per artifact set
+ROW_INDEPENDENT = False
+# Fewest recognised input columns an upload needs to be scored by this model
+MIN_OVERLAP = 10
+# Features a manual or JSON batch request must give a value for
+REQUIRED_FEATURES = [
+    'pl_eqt', 'pl_tranmid_snr', 'st_tmag', 'pl_orbper_snr', 'pl_trandurherr2',
+    'st_dist', 'pl_insol', 'depth_mag_ratio', 'pl_tranmid', 'dec', 'pl_orbper', 'pl_rade'
+]
+
+# Admin columns dropped before preprocessing
+ADMIN_COLUMNS = {"toi", "tid", "rastr", "decstr", "rowupdate", "toi_created",
+                 "tfopwg_disp", "tfopwg_d"}
+
+# Feature engineering (SNR, ratios, absolute magnitude): (name, input columns, formula).
+# Inputs are upload columns or other engineered features
+ERROR_PAIRS = [
+    ('pl_orbper', 'pl_orbpererr1'), ('pl_tranmid', 'pl_tranmiderr1'),
+    ('pl_trandur', 'pl_trandurerr1'), ('pl_trandep', 'pl_trandeperr1'),
+    ('pl_rade', 'pl_radeerr1'), ('st_teff', 'st_tefferr1'),
+    ('st_rad', 'st_raderr1'), ('st_logg', 'st_loggerr1')
+]
+ENGINEERED_FEATURES = [
+    (f'{val_col}_snr', (val_col, err_col), lambda val, err: val / (err + 1e-10))
+    for val_col, err_col in ERROR_PAIRS
+] + [
+    ('planet_star_radius_ratio', ('pl_rade', 'st_rad'), lambda rade, rad: rade / (rad * 109.2)),
+    ('depth_mag_ratio', ('pl_trandep', 'st_tmag'), lambda dep, tmag: dep * tmag),
+    ('absolute_mag', ('st_tmag', 'st_dist'), lambda tmag, dist: tmag - 5 * np.log10(dist / 10)),
+]
+FEATURE_GRAPH = {name: (inputs, formula) for name, inputs, formula in ENGINEERED_FEATURES}
+
+def engineering_plan(columns):
+    """Engineered features that feed `columns`, each after the engineered features it reads"""
+    plan = []
+    def visit(name):
+        if name in FEATURE_GRAPH and name not in plan:
+            for dependency in FEATURE_GRAPH[name][0]:
+                visit(dependency)
+            plan.append(name)
+    for column in columns:
+        visit(column)
+    return plan
+
+def working_columns(imputer, scaler):
+    """The scaler features followed by any imputer-only features"""
+    imputer_features = imputer.feature_names_in_.tolist()
+    scaler_features = scaler.feature_names_in_.tolist()
+    return scaler_features + [c for c in imputer_features if c not in scaler_features]
 
 # -------------------------------
-# Paths
-# -------------------------------
-script_dir = os.path.dirname(os.path.abspath(__file__))
+# Load preprocessing objects and trained TESS model
 # -------------------------------
-# Load preprocessing objects
-# -------------------------------
-with open(os.path.join(script_dir, "models", "toi_preprocess.pkl"), "rb") as f:
-    objs = pickle.load(f)
+def load(models_dir, shared):
+    """Loads the TOI artifacts; numeric arrays are shared between workers"""
+    with open(os.path.join(models_dir, "toi_preprocess.pkl"), "rb") as f:
+        objs = pickle.load(f)
 
-imputer = objs["imputer"]
-scaler = objs["scaler"]
-label_encoder = objs["label_encoder"]
-feature_names = objs["feature_names"] 
+    imputer = objs["imputer"]
+    scaler = objs["scaler"]
+    feature_names = objs["feature_names"]
 
-# -------------------------------
-# Load trained TESS model
-# -------------------------------
-with open(os.path.join(script_dir, "models", "toi.pkl"), "rb") as f:
-    model = pickle.load(f)
+    imputer_features = imputer.feature_names_in_.tolist()
+    scaler_features = scaler.feature_names_in_.tolist()
+
+    # Select TOP-33. Clipping, imputation and scaling are per column, so only
+    # these columns are worked on; the rest of the scaler features would be
+    # computed and then dropped
+    columns = [feat for feat in feature_names if feat in scaler_features]
+    center, scale = scaler_arrays(scaler, columns)
+
+    # Outlier fences fitted on the training data (python -m inference.outlier_stats toi);
+    # older artifacts without them fall back to per-batch quantiles
+    outlier_stats = objs.get("outlier_stats")
+    lower, upper = outlier_bounds(outlier_stats, columns) if outlier_stats else (None, None)
+
+    transform = CompiledTransform(
+        columns,
+        lower=lower,
+        upper=upper,
+        fill=imputer_fill_values(imputer, columns),
+        center=center,
+        scale=scale,
+    ).share(shared)
+
+    # Upload columns preprocess() reads: the imputer features and the inputs of the engineered ones
+    plan = engineering_plan(columns)
+    engineering_inputs = [c for name in plan for c in FEATURE_GRAPH[name][0] if c not in FEATURE_GRAPH]
+    read_columns = list(dict.fromkeys(imputer_features + columns + engineering_inputs))
+
+    with open(os.path.join(models_dir, "toi.pkl"), "rb") as f:
+        model = pickle.load(f)
+    # Trees are compiled from XGBoost models only; any other classifier predicts through the model itself
+    booster = model.get_booster() if isinstance(model, xgb.XGBModel) else None
+
+    return {
+        "imputer": imputer,
+        "scaler": scaler,
+        "label_encoder": objs["label_encoder"],
+        "feature_names": feature_names,
+        "input_features": imputer_features,
+        "read_columns": read_columns,
+        "outlier_stats": outlier_stats,
+        "row_independent": bool(outlier_stats),
+        "transform": transform,
+        "engineering_plan": plan,
+        "model": model,
+        # Single rows and small batches (/predict/manual) walk flat arrays instead
+        "flat_trees": compile_flat_trees(booster, iteration_range(booster), shared) if booster is not None else None,
+        # Large batches optionally go through the first rounds only, then the whole ensemble for unsure rows
+        "cascade": compile_cascade(MODEL_TYPE, booster, iteration_range(booster)) if booster is not None else None,
+    }
+
+def __getattr__(name):
+    """Expose the loaded artifacts (feature_names, model, ...) as module attributes"""
+    if not name.startswith("__"):
+        artifacts = model_registry.get(MODEL_TYPE).artifacts
+        if name in artifacts:
+            return artifacts[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def feature_matrix(df, transform, plan):
+    """Working matrix with the engineered features in `plan`, before outlier handling.
+
+    Returns the matrix, the columns the input provides and the columns that
+    get outlier handling (numeric input columns and engineered features).
+    """
+    # Admin columns dropped; absent features are NaN
+    X = transform.gather(df, exclude=ADMIN_COLUMNS)
+    column_index = {c: j for j, c in enumerate(transform.columns)}
+    present = {c for c in df.columns if c not in ADMIN_COLUMNS}
+    present_mask = np.array([c in present for c in transform.columns])
+
+    numeric = {c for c in present if pd.api.types.is_numeric_dtype(df[c].dtype)
+               and not pd.api.types.is_bool_dtype(df[c].dtype)}
+    clip_mask = np.array([c in numeric for c in transform.columns])
+
+    # Feature engineering (SNR, ratios, absolute magnitude)
+    computed = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in plan:
+            inputs, formula = FEATURE_GRAPH[name]
+            if all(c in computed or c in present for c in inputs):
+                values = [computed[c] if c in computed else df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+                          for c in inputs]
+                computed[name] = formula(*values)
+                j = column_index.get(name)
+                if j is not None:
+                    X[:, j] = computed[name]
+                    present_mask[j] = clip_mask[j] = True
+    return X, present_mask, clip_mask
+
+def fit_outlier_stats(df, objs):
+    """Outlier fences of the training data in k2's outlier_stats form.
+
+    The same 1%/99% quantile fences preprocess() used to take from each
+    batch, computed once over the whole training set.
+    """
+    columns = working_columns(objs["imputer"], objs["scaler"])
+    transform = CompiledTransform(columns)
+    X, _, clip_mask = feature_matrix(df, transform, engineering_plan(columns))
+    lower, upper = quantile_bounds(X, np.flatnonzero(clip_mask))
+    return {
+        c: {"lower": float(lower[j]), "upper": float(upper[j])}
+        for j, c in enumerate(transform.columns)
+        if clip_mask[j] and (np.isfinite(lower[j]) or np.isfinite(upper[j]))
+    }
+
+def preprocess(df, loaded=None):
+    loaded = loaded or model_registry.get(MODEL_TYPE)
+    imputer = loaded.artifacts["imputer"]
+    transform = loaded.artifacts["transform"]
 
-def preprocess(df):
     # Check overlap with imputer features
-    overlap = [c for c in df.columns if c in imputer.feature_names_in_]
-    if len(overlap) < 10:  # Reduced threshold
+    imputer_features = set(imputer.feature_names_in_)
+    overlap = [c for c in df.columns if c in imputer_features]
+    if len(overlap) < MIN_OVERLAP:  # Reduced threshold
         return f"Input data does not have enough valid TOI features (found only {len(overlap)}). Required features include: {list(imputer.feature_names_in_)[:10]}"
 
-    # Drop admin columns if present
-    admin_cols = ["toi", "tid", "rastr", "decstr", "rowupdate", "toi_created",
-                  "tfopwg_disp", "tfopwg_d"]
-    df = df.drop(columns=[c for c in admin_cols if c in df.columns], errors="ignore")
+    with stage("preprocess"):
+        X, present_mask, clip_mask = feature_matrix(df, transform, loaded.artifacts["engineering_plan"])
 
-    # Numeric columns
-    num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        # Outlier handling: training fences when stored, else this batch's 1%/99% quantiles
+        if loaded.artifacts["outlier_stats"]:
+            transform.clip(X, np.where(clip_mask, transform.lower, -np.inf),
+                           np.where(clip_mask, transform.upper, np.inf))
+        else:
+            lower, upper = quantile_bounds(X, np.flatnonzero(clip_mask))
+            transform.clip(X, lower, upper)
 
-    # Feature engineering (SNR, ratios, absolute magnitude)
-    error_pairs = [
-        ('pl_orbper', 'pl_orbpererr1'), ('pl_tranmid', 'pl_tranmiderr1'),
-        ('pl_trandur', 'pl_trandurerr1'), ('pl_trandep', 'pl_trandeperr1'),
-        ('pl_rade', 'pl_radeerr1'), ('st_teff', 'st_tefferr1'),
-        ('st_rad', 'st_raderr1'), ('st_logg', 'st_loggerr1')
-    ]
-    for val_col, err_col in error_pairs:
-        if val_col in df.columns and err_col in df.columns:
-            new_col = f'{val_col}_snr'
-            df[new_col] = df[val_col] / (df[err_col] + 1e-10)
-            if new_col not in num_cols:
-                num_cols.append(new_col)
-
-    if 'pl_rade' in df.columns and 'st_rad' in df.columns:
-        df['planet_star_radius_ratio'] = df['pl_rade'] / (df['st_rad'] * 109.2)
-        num_cols.append('planet_star_radius_ratio')
-
-    if 'pl_trandep' in df.columns and 'st_tmag' in df.columns:
-        df['depth_mag_ratio'] = df['pl_trandep'] * df['st_tmag']
-        num_cols.append('depth_mag_ratio')
-
-    if 'st_dist' in df.columns and 'st_tmag' in df.columns:
-        df['absolute_mag'] = df['st_tmag'] - 5 * np.log10(df['st_dist'] / 10)
-        num_cols.append('absolute_mag')
-
-    # Outlier handling
-    num_cols_present = [c for c in num_cols if c in df.columns]
-    for col in num_cols_present:
-        Q1, Q3 = df[col].quantile(0.01), df[col].quantile(0.99)
-        IQR = Q3 - Q1
-        df[col] = df[col].clip(lower=Q1 - 3*IQR, upper=Q3 + 3*IQR)
-
-    # Impute missing values
-    imputer_features = imputer.feature_names_in_.tolist()
-    for col in imputer_features:
-        if col not in df.columns:
-            df[col] = np.nan
-    df_for_imputation = df[imputer_features].replace({pd.NA: np.nan})
-    df_imputed = pd.DataFrame(imputer.transform(df_for_imputation),
-                              columns=imputer_features,
-                              index=df.index)
-    for col in imputer_features:
-        df[col] = df_imputed[col]
-
-    # Scale features
-    scaler_features = scaler.feature_names_in_.tolist()
-    for col in scaler_features:
-        if col not in df.columns:
-            df[col] = 0
-    df_for_scaling = df[scaler_features]
-    df_scaled = scaler.transform(df_for_scaling)
+    # Impute missing values; scaler features the input lacks entirely are zero
+    with stage("impute"):
+        transform.impute(X)
+        X[:, ~present_mask & np.isnan(transform.fill)] = 0
 
-    # Select TOP-33
-    top_33_indices = [scaler_features.index(feat) for feat in feature_names if feat in scaler_features]
-    X_top33 = df_scaled[:, top_33_indices]
+    # Scale the TOP-33 features
+    with stage("scale"):
+        transform.scale_features(X)
+        return transform.select(X)
 
-    return X_top33
-
-def predict(df):
+def predict(df, loaded=None):
     """Make predictions using TOI model (with probabilities)"""
     try:
+        loaded = loaded or model_registry.get(MODEL_TYPE)
+        model = loaded.artifacts["model"]
+        label_encoder = loaded.artifacts["label_encoder"]
+
         # Preprocess data
-        processed_data = preprocess(df)
+        processed_data = preprocess(df, loaded)
 
         # Check if preprocessing returned an error
         if isinstance(processed_data, str):
             return processed_data
 
         # Make predictions
-        predictions = model.predict(processed_data)
-        prediction_proba = model.predict_proba(processed_data)
-
-        # Convert predictions to string labels
-        pred_labels = label_encoder.inverse_transform(predictions.astype(int))
-
-        # Confidence = highest probability per sample
-        pred_confidence = np.max(prediction_proba, axis=1)
-
-        # Build result DataFrame
-        df_output = df.copy()
-        df_output["predicted_class"] = pred_labels
-        df_output["confidence"] = pred_confidence
-
-        # Add probability columns for each class
-        for i, class_name in enumerate(label_encoder.classes_):
-            df_output[f"prob_{class_name}"] = prediction_proba[:, i]
-
-        return df_output
+        decided_by = None
+        with stage("predict"):
+            if use_flat_trees(loaded.artifacts["flat_trees"], len(processed_data)):
+                prediction_proba = loaded.artifacts["flat_trees"].predict_proba(processed_data)
+                predictions = np.argmax(prediction_proba, axis=1)
+            elif loaded.artifacts["cascade"] is not None:
+                prediction_proba, decided_by = cascade_proba(loaded.artifacts["cascade"], processed_data,
+                                                             model.predict_proba)
+                predictions = np.argmax(prediction_proba, axis=1)
+            else:
+                predictions = model.predict(processed_data)
+                prediction_proba = model.predict_proba(processed_data)
+
+        with stage("output"):
+            # Labels, confidence (highest probability) and class probabilities appended to the input, not a copy
+            pred_labels = class_labels(predictions, label_encoder.classes_)
+            return prediction_frame(df, pred_labels, prediction_proba, label_encoder.classes_, decided_by)
 
     except Exception as e:
         return f"TOI prediction failed: {str(e)}"
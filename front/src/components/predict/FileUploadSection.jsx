@@ -19,7 +19,7 @@ const FileUploadSection = ({
     if (selectedFile) {
       const fileType = selectedFile.name.split('.').pop().toLowerCase();
       if (!PREDICTION_CONSTANTS.ALLOWED_FILE_TYPES.includes(fileType)) {
-        onFileChange(null, 'Please select a CSV or Excel file');
+        onFileChange(null, 'Please select a CSV, Excel, Parquet or Feather file');
         return;
       }
       onFileChange(selectedFile, '');
@@ -29,7 +29,7 @@ const FileUploadSection = ({
   return (
     <Box sx={{ mb: 3 }}>
       <Typography variant="body2" color="text.secondary" sx={{ mb: 2 }}>
-        Upload your K2, TOI, or Kepler dataset (CSV/Excel) to get exoplanet predictions
+        Upload your K2, TOI, or Kepler dataset (CSV/Excel/Parquet/Feather) to get exoplanet predictions
       </Typography>
       
       <Box sx={{ display: 'flex', gap: 2, alignItems: 'center', mb: 2 }}>
@@ -51,7 +51,7 @@ const FileUploadSection = ({
           <input
             type="file"
             hidden
-            accept=".csv,.xlsx,.xls"
+            accept=".csv,.xlsx,.xls,.parquet,.feather,.arrow"
             onChange={handleFileChange}
           />
         </Button>
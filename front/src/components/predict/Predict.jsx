@@ -55,6 +55,8 @@ const Predict = ({ persistentState = {}, onStateChange, onViewPlanetInfo }) => {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('type', modelType);
+    // The downloadable CSV keeps every uploaded column next to the predictions
+    formData.append('columns', 'all');
 
     try {
       const response = await dataApi.predict(formData);
@@ -8,6 +8,15 @@ import { Visibility } from '@mui/icons-material';
 const ResultsSection = ({ results, inputData, modelType, onViewPlanetInfo }) => {
   if (!results) return null;
 
+  // File results carry class counts for every row; predictions holds only the first 100
+  const exoplanetCount = results.class_counts
+    ? Object.entries(results.class_counts)
+        .filter(([label]) => label !== 'FALSE POSITIVE')
+        .reduce((sum, [, count]) => sum + count, 0)
+    : Array.isArray(results.predictions)
+      ? results.predictions.filter(p => typeof p === 'string' ? p !== 'FALSE POSITIVE' : p).length
+      : (results.predictions && results.predictions !== 'FALSE POSITIVE' ? 1 : 0);
+
   return (
     <Box>
       <Typography variant="h6" gutterBottom>
@@ -24,7 +33,7 @@ const ResultsSection = ({ results, inputData, modelType, onViewPlanetInfo }) =>
         <Chip label={`Model: ${results.model_type.toUpperCase()}`} sx={{ mr: 1 }} />
         <Chip label={`Rows: ${results.rows_processed}`} sx={{ mr: 1 }} />
         <Chip 
-          label={`Exoplanets: ${Array.isArray(results.predictions) ? results.predictions.filter(p => typeof p === 'string' ? p !== 'FALSE POSITIVE' : p).length : (results.predictions && results.predictions !== 'FALSE POSITIVE' ? 1 : 0)}`} 
+          label={`Exoplanets: ${exoplanetCount}`} 
           color="success" 
         />
       </Box>
@@ -102,7 +111,7 @@ const ResultsSection = ({ results, inputData, modelType, onViewPlanetInfo }) =>
         </Table>
       </TableContainer>
       
-      {Array.isArray(results.predictions) && results.predictions.length > 100 && (
+      {Array.isArray(results.predictions) && results.rows_processed > Math.min(results.predictions.length, 100) && (
         <Typography variant="caption" sx={{ mt: 1, display: 'block' }}>
           Showing first 100 results. Download CSV for complete results.
         </Typography>
@@ -1,5 +1,5 @@
 export const PREDICTION_CONSTANTS = {
-  ALLOWED_FILE_TYPES: ['csv', 'xlsx', 'xls'],
+  ALLOWED_FILE_TYPES: ['csv', 'xlsx', 'xls', 'parquet', 'feather', 'arrow'],
   
   // K2 Model Features (Top 10 required, rest optional)
   K2_REQUIRED_FEATURES: [